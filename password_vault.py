@@ -1,6 +1,6 @@
 """
 ╔══════════════════════════════════════════════════════════════╗
-║              VAULT — MD5 Password Manager                    ║
+║             VAULT — Salted-Hash Password Manager             ║
 ║         Dark Luxury Edition | Run from Spyder               ║
 ╚══════════════════════════════════════════════════════════════╝
 
@@ -9,20 +9,27 @@ Requirements:
     All other libs are from standard library.
 
 Run directly in Spyder: press F5 or Run → Run File
+
+This file is the Tk front end; hashing, storage and the in-memory index
+live in vault_core.py, which must sit in the same folder.
 """
 
 import tkinter as tk
 from tkinter import ttk, messagebox, font as tkfont
-import hashlib
-import xml.etree.ElementTree as ET
-import xml.dom.minidom as minidom
 import os
 import time
+import queue
+import itertools
 import threading
+import traceback
+from collections import OrderedDict
 from datetime import datetime
 
-# ─── CONFIG ──────────────────────────────────────────────────────────────────
-DB_FILE = os.path.join(os.path.expanduser("~"), "vault_database.xml")
+import vault_core
+from vault_core import (
+    hash_password, load_db, add_entry, delete_entry, lookup_entry, search_entries,
+    query_entries, subscribe,
+)
 
 # ─── PALETTE — Midnight Luxury ────────────────────────────────────────────────
 C = {
@@ -44,82 +51,6 @@ C = {
     "tag_bg":      "#1E2240",   # Tag background
 }
 
-# ─── DATABASE LAYER ───────────────────────────────────────────────────────────
-def md5_hash(text: str) -> str:
-    return hashlib.md5(text.encode("utf-8")).hexdigest()
-
-
-def load_db() -> list[dict]:
-    """Load entries from XML file. Returns list of dicts."""
-    if not os.path.exists(DB_FILE):
-        return []
-    try:
-        tree = ET.parse(DB_FILE)
-        root = tree.getroot()
-        entries = []
-        for entry in root.findall("entry"):
-            entries.append({
-                "username":      entry.findtext("username", ""),
-                "username_hash": entry.findtext("username_hash", ""),
-                "password_hash": entry.findtext("password_hash", ""),
-                "created":       entry.findtext("created", ""),
-                "label":         entry.findtext("label", ""),
-            })
-        return entries
-    except Exception:
-        return []
-
-
-def save_db(entries: list[dict]):
-    """Save entries to XML file with pretty-print."""
-    root = ET.Element("vault")
-    root.set("version", "1.0")
-    root.set("updated", datetime.now().isoformat())
-    for e in entries:
-        entry_el = ET.SubElement(root, "entry")
-        for key, val in e.items():
-            child = ET.SubElement(entry_el, key)
-            child.text = str(val)
-    raw = ET.tostring(root, encoding="unicode")
-    pretty = minidom.parseString(raw).toprettyxml(indent="  ")
-    # Remove the default XML declaration line so we can write our own
-    lines = pretty.split("\n")
-    final = "\n".join(lines)
-    with open(DB_FILE, "w", encoding="utf-8") as f:
-        f.write(final)
-
-
-def add_entry(username: str, password: str, label: str = "") -> dict:
-    entries = load_db()
-    entry = {
-        "username":      username,
-        "username_hash": md5_hash(username),
-        "password_hash": md5_hash(password),
-        "created":       datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        "label":         label or "Default",
-    }
-    entries.append(entry)
-    save_db(entries)
-    return entry
-
-
-def delete_entry(index: int):
-    entries = load_db()
-    if 0 <= index < len(entries):
-        entries.pop(index)
-        save_db(entries)
-
-
-def lookup_entry(username: str, password: str):
-    """Return matching entry if credentials match."""
-    u_hash = md5_hash(username)
-    p_hash = md5_hash(password)
-    for e in load_db():
-        if e["username_hash"] == u_hash and e["password_hash"] == p_hash:
-            return e
-    return None
-
-
 # ─── ANIMATED TYPEWRITER LABEL ────────────────────────────────────────────────
 class TypewriterLabel(tk.Label):
     def __init__(self, master, full_text="", delay=40, **kwargs):
@@ -320,19 +251,277 @@ class GoldButton(tk.Frame):
         )
 
 
+class VirtualList(tk.Frame):
+    """Scrollable table that only builds widgets for the rows on screen.
+
+    A fixed pool of row frames is recycled as the view scrolls, so widget
+    count and redraw cost depend on the window height, not on how many
+    rows the list holds. `formatter(i, row)` returns the cells for row i
+    as [(text, width, color), ...]. `selected` holds key(row) of the
+    selected row (-1 for none), so the selection follows the row when
+    rows are inserted or removed above it.
+    """
+    ROW_HEIGHT = 36
+
+    def __init__(self, master, formatter, key, on_select=None,
+                 empty_text="", **kwargs):
+        super().__init__(master, bg=C["card"], **kwargs)
+        self._formatter = formatter
+        self._key       = key
+        self._on_select = on_select
+        self._rows      = []
+        self._top       = 0
+        self._pool      = []
+        self._redraw_pending = False
+        self.selected   = tk.IntVar(value=-1)
+
+        self.scrollbar = tk.Scrollbar(self, orient="vertical", command=self._yview)
+        self.scrollbar.pack(side="right", fill="y")
+        self.body = tk.Frame(self, bg=C["card"])
+        self.body.pack(side="left", fill="both", expand=True)
+
+        self.empty_lbl = tk.Label(self.body, text=empty_text,
+                                  fg=C["text_dim"], bg=C["card"],
+                                  font=("Courier New", 11), justify="center")
+
+        self.body.bind("<Configure>", lambda e: self._scroll_to(self._top))
+        self.body.bind_all("<MouseWheel>",
+            lambda e: self._scroll_to(self._top - int(e.delta / 120) * 3))
+
+    # ── data ──────────────────────────────────────────────────────────────
+    def set_rows(self, rows):
+        """Show `rows` (any sequence); only the visible slice is drawn."""
+        self._rows = rows
+        self.selected.set(-1)
+        self._scroll_to(self._top)
+
+    def refresh(self):
+        """Redraw the visible rows after the sequence changed in place.
+
+        Coalesced into one redraw per idle cycle, so a burst of changes
+        costs a single render.
+        """
+        if not self._redraw_pending:
+            self._redraw_pending = True
+            self.after_idle(self._redraw)
+
+    def _redraw(self):
+        self._redraw_pending = False
+        self._scroll_to(self._top)
+
+    def __len__(self):
+        return len(self._rows)
+
+    # ── scrolling ─────────────────────────────────────────────────────────
+    def _visible_count(self):
+        return max(1, self.body.winfo_height() // self.ROW_HEIGHT)
+
+    def _scroll_to(self, top):
+        max_top = max(0, len(self._rows) - self._visible_count())
+        self._top = max(0, min(int(top), max_top))
+        self._render()
+
+    def _yview(self, action, amount, unit=None):
+        if action == "moveto":
+            self._scroll_to(float(amount) * len(self._rows))
+        elif unit == "pages":
+            self._scroll_to(self._top + int(amount) * self._visible_count())
+        else:
+            self._scroll_to(self._top + int(amount))
+
+    # ── rendering ─────────────────────────────────────────────────────────
+    def _make_slot(self):
+        row = tk.Frame(self.body, padx=24, pady=9,
+                       highlightbackground=C["border"], highlightthickness=0)
+        row.data_index = -1
+        row.base_bg = C["card"]
+
+        def _enter(ev, r=row):
+            r.config(bg=C["hover"])
+            for child in r.winfo_children(): child.config(bg=C["hover"])
+        def _leave(ev, r=row):
+            r.config(bg=r.base_bg)
+            for child in r.winfo_children(): child.config(bg=r.base_bg)
+        def _select(ev, r=row):
+            if r.data_index < 0:
+                return
+            self.selected.set(self._key(self._rows[r.data_index]))
+            if self._on_select:
+                self._on_select(r.data_index)
+        row.bind("<Enter>", _enter)
+        row.bind("<Leave>", _leave)
+        row.bind("<Button-1>", _select)
+
+        row.rb = tk.Radiobutton(row, variable=self.selected, value=-1,
+                                activebackground=C["hover"],
+                                selectcolor=C["accent"],
+                                highlightthickness=0, bd=0)
+        row.rb.pack(side="left")
+        row.rb.bind("<Button-1>", _select)
+        row.cells = []
+        return row
+
+    def _render(self):
+        visible = self._visible_count() + 1
+        while len(self._pool) < visible:
+            self._pool.append(self._make_slot())
+
+        if not self._rows:
+            for row in self._pool:
+                row.place_forget()
+            self.empty_lbl.place(relx=0.5, rely=0.4, anchor="center")
+            self.scrollbar.set(0, 1)
+            return
+        self.empty_lbl.place_forget()
+
+        for k, row in enumerate(self._pool):
+            i = self._top + k
+            if k >= visible or i >= len(self._rows):
+                row.place_forget()
+                row.data_index = -1
+                continue
+            row.data_index = i
+            row.base_bg = C["card"] if i % 2 == 0 else C["surface"]
+            row.config(bg=row.base_bg)
+            row.rb.config(value=self._key(self._rows[i]), bg=row.base_bg)
+            cells = self._formatter(i, self._rows[i])
+            while len(row.cells) < len(cells):
+                lbl = tk.Label(row, font=("Courier New", 9), anchor="w")
+                lbl.pack(side="left", padx=3)
+                row.cells.append(lbl)
+            for lbl, (text, w, color) in zip(row.cells, cells):
+                lbl.config(text=text[:w], width=w, fg=color, bg=row.base_bg)
+            row.place(x=0, y=k * self.ROW_HEIGHT, relwidth=1, height=self.ROW_HEIGHT)
+
+        total = len(self._rows)
+        self.scrollbar.set(self._top / total,
+                           min(1.0, (self._top + visible - 1) / total))
+
+
+# ─── BACKGROUND I/O ───────────────────────────────────────────────────────────
+class IOWorker:
+    """Runs vault I/O on one background thread so the Tk mainloop never blocks.
+
+    Jobs go through a request queue; results come back through a reply
+    queue that the Tk thread drains with root.after, so callbacks always
+    run on the UI thread. A job submitted with a `key` supersedes earlier
+    jobs with the same key: if they have not started they are skipped,
+    otherwise their result is dropped.
+    """
+    POLL_MS = 30
+
+    def __init__(self, root, on_error=None, on_busy=None):
+        self.root      = root
+        self.on_error  = on_error    # default error callback(exc)
+        self.on_busy   = on_busy     # callback(bool) for a loading indicator
+        self._jobs     = queue.Queue()
+        self._replies  = queue.Queue()
+        self._tickets  = itertools.count(1)
+        self._latest   = {}          # key → ticket of the newest job
+        self._pending  = 0
+        self._thread   = threading.Thread(target=self._run, name="vault-io", daemon=True)
+        self._thread.start()
+        self.root.after(self.POLL_MS, self._poll)
+
+    def submit(self, fn, *args, on_done=None, on_error=None, key=None):
+        ticket = next(self._tickets)
+        if key is not None:
+            self._latest[key] = ticket
+        self._set_pending(self._pending + 1)
+        self._jobs.put((ticket, key, fn, args, on_done, on_error))
+        return ticket
+
+    def post(self, fn, *args):
+        """Queue fn(*args) to run on the UI thread (safe from any thread)."""
+        self._replies.put((None, None, fn, args))
+
+    def close(self, timeout=5.0):
+        """Finish queued jobs, then stop the worker thread."""
+        self._jobs.put(None)
+        self._thread.join(timeout)
+
+    def _current(self, ticket, key):
+        return key is None or self._latest.get(key) == ticket
+
+    def _run(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            ticket, key, fn, args, on_done, on_error = job
+            if not self._current(ticket, key):
+                self._replies.put((ticket, key, None, ()))
+                continue
+            try:
+                result = fn(*args)
+            except Exception as exc:
+                self._replies.put((ticket, key, on_error or self.on_error, (exc,)))
+            else:
+                self._replies.put((ticket, key, on_done, (result,)))
+
+    def _poll(self):
+        try:
+            while True:
+                try:
+                    ticket, key, callback, args = self._replies.get_nowait()
+                except queue.Empty:
+                    break
+                if ticket is not None:
+                    self._set_pending(self._pending - 1)
+                    if not self._current(ticket, key):
+                        continue
+                if callback:
+                    try:
+                        callback(*args)
+                    except Exception as exc:
+                        # A failing callback must not stop later results reaching the UI
+                        self._report(exc)
+        finally:
+            self.root.after(self.POLL_MS, self._poll)
+
+    def _report(self, exc):
+        if self.on_error:
+            try:
+                self.on_error(exc)
+                return
+            except Exception:
+                pass
+        traceback.print_exception(type(exc), exc, exc.__traceback__)
+
+    def _set_pending(self, n):
+        was_busy, self._pending = self._pending > 0, n
+        if self.on_busy and was_busy != (n > 0):
+            self.on_busy(n > 0)
+
+
 # ─── MAIN APPLICATION ─────────────────────────────────────────────────────────
 class VaultApp:
+    PREVIEW_DEBOUNCE_MS = 150    # quiet time after a keystroke before hashing
+    PREVIEW_CACHE_SIZE  = 32     # recent (password, salt, algo) → hash results
+    FILTER_DEBOUNCE_MS  = 120    # quiet time after a keystroke before filtering the vault
+    SORTABLE = ("username", "label", "created")    # vault columns query_entries() orders by
+
     def __init__(self):
         self.root = tk.Tk()
-        self.root.title("VAULT — MD5 Password Manager")
+        self.root.title("VAULT — Salted-Hash Password Manager")
         self.root.geometry("960x700")
         self.root.minsize(860, 620)
         self.root.configure(bg=C["bg"])
         self.root.resizable(True, True)
 
         self.toast = Toast(self.root)
+        self.io = IOWorker(self.root, on_error=self._on_io_error, on_busy=self._on_io_busy)
+        # Own thread for the hash preview, so a KDF never delays vault I/O
+        self.preview_io = IOWorker(self.root, on_error=self._on_io_error)
+        self._preview_after = None
+        self._preview_cache = OrderedDict()
         self._build_ui()
         self._refresh_vault_list()
+        # Change events fire on the I/O thread; hop back to Tk before touching widgets
+        subscribe(lambda *ev: self.io.post(self._on_vault_change, *ev))
+        # Wrap any legacy MD5 hashes in the current KDF, a batch at a time
+        self.migration = vault_core.HashMigration(
+            on_progress=lambda *p: self.io.post(self._on_migration_progress, *p)).start()
 
     # ── HEADER ────────────────────────────────────────────────────────────────
     def _build_header(self, parent):
@@ -347,7 +536,7 @@ class VaultApp:
                  font=("Courier New", 24)).pack(side="left", padx=(0,8))
         tk.Label(logo_frame, text="VAULT", fg=C["text"], bg=C["bg"],
                  font=("Courier New", 20, "bold")).pack(side="left")
-        tk.Label(logo_frame, text=" MD5 SECURE STORE", fg=C["text_muted"], bg=C["bg"],
+        tk.Label(logo_frame, text=f" {vault_core.HASH_ALGO.upper()} SECURE STORE", fg=C["text_muted"], bg=C["bg"],
                  font=("Courier New", 9)).pack(side="left", padx=(6,0), pady=(8,0))
 
         # Live clock
@@ -356,8 +545,18 @@ class VaultApp:
         self.clock_lbl.pack(side="right", padx=4)
         self._tick_clock()
 
+        # Background I/O indicator
+        self.busy_lbl = tk.Label(hdr, text="", fg=C["accent2"], bg=C["bg"],
+                                 font=("Courier New", 8, "bold"))
+        self.busy_lbl.pack(side="right", padx=4)
+
+        # Hash migration progress
+        self.migrate_lbl = tk.Label(hdr, text="", fg=C["text_muted"], bg=C["bg"],
+                                    font=("Courier New", 8))
+        self.migrate_lbl.pack(side="right", padx=4)
+
         # DB path badge
-        short = os.path.basename(DB_FILE)
+        short = os.path.basename(vault_core.DB_FILE)
         tk.Label(hdr, text=f"  {short}  ", fg=C["text_muted"], bg=C["tag_bg"],
                  font=("Courier New", 8), padx=6, pady=2).pack(side="right", padx=8)
 
@@ -366,6 +565,19 @@ class VaultApp:
         tk.Frame(parent, bg=C["bg"],     height=1).pack(fill="x")
         tk.Frame(parent, bg=C["border"], height=1).pack(fill="x")
 
+    def _on_io_busy(self, busy):
+        self.busy_lbl.config(text="◌  LOADING…" if busy else "")
+
+    def _on_migration_progress(self, done, total, rate):
+        if done >= total:
+            self.migrate_lbl.config(text="")
+            self.toast.show(f"Upgraded {total} legacy hash{'es' if total != 1 else ''}", "success")
+        else:
+            self.migrate_lbl.config(text=f"⇡ UPGRADING HASHES {done:,}/{total:,} · {rate:,.0f}/s")
+
+    def _on_io_error(self, exc):
+        self.toast.show(f"Vault I/O failed: {exc}", "error")
+
     def _tick_clock(self):
         self.clock_lbl.config(text=datetime.now().strftime("⏱  %Y-%m-%d  %H:%M:%S"))
         self.root.after(1000, self._tick_clock)
@@ -437,7 +649,7 @@ class VaultApp:
         title_row.pack(fill="x")
         tk.Label(title_row, text="ADD NEW CREDENTIAL", fg=C["accent"],
                  bg=C["card"], font=("Courier New", 12, "bold")).pack(side="left")
-        tk.Label(title_row, text="Passwords stored as MD5 hash", fg=C["text_muted"],
+        tk.Label(title_row, text=f"Passwords stored as {vault_core.HASH_ALGO} hash", fg=C["text_muted"],
                  bg=C["card"], font=("Courier New", 8)).pack(side="right", pady=(4,0))
 
         tk.Frame(inner, bg=C["border"], height=1).pack(fill="x")
@@ -468,7 +680,7 @@ class VaultApp:
 
         ph_inner = tk.Frame(preview_frame, bg=C["input_bg"], padx=14, pady=10)
         ph_inner.pack(fill="x")
-        tk.Label(ph_inner, text="MD5 PREVIEW", fg=C["text_dim"], bg=C["input_bg"],
+        tk.Label(ph_inner, text="HASH PREVIEW", fg=C["text_dim"], bg=C["input_bg"],
                  font=("Courier New", 7, "bold")).pack(anchor="w")
         self.hash_preview = tk.Label(ph_inner, text="Type password to preview hash...",
                                       fg=C["text_dim"], bg=C["input_bg"],
@@ -476,6 +688,8 @@ class VaultApp:
         self.hash_preview.pack(fill="x")
 
         self.add_pass.entry.bind("<KeyRelease>", self._update_hash_preview)
+        # Salt for the entry being typed, so the preview is exactly what gets stored
+        self._preview_salt = os.urandom(16).hex()
 
         # Buttons
         btn_row = tk.Frame(form, bg=C["card"])
@@ -491,18 +705,50 @@ class VaultApp:
 
         return frame
 
+    def _preview_key(self):
+        # Stripped like _add_entry strips it, so the preview matches what is stored
+        return (self.add_pass.get().strip(), self._preview_salt, vault_core.HASH_ALGO)
+
     def _update_hash_preview(self, e=None):
-        pw = self.add_pass.get()
-        if pw:
-            h = md5_hash(pw)
-            # Format with spaces for readability
-            formatted = "  ".join([h[i:i+8] for i in range(0, 32, 8)])
-            self.hash_preview.config(
-                text=f"md5 → {formatted}",
-                fg=C["accent2"]
-            )
-        else:
+        if self._preview_after is not None:
+            self.root.after_cancel(self._preview_after)
+            self._preview_after = None
+        key = self._preview_key()
+        if not key[0]:
             self.hash_preview.config(text="Type password to preview hash...", fg=C["text_dim"])
+        elif key in self._preview_cache:
+            self._preview_cache.move_to_end(key)
+            self._show_hash_preview(self._preview_cache[key])
+        else:
+            # A KDF takes tens of ms: wait for a pause in typing, then hash
+            # off the UI thread. Dim the old hash meanwhile.
+            self.hash_preview.config(fg=C["text_dim"])
+            self._preview_after = self.root.after(self.PREVIEW_DEBOUNCE_MS, self._start_preview)
+
+    def _start_preview(self):
+        self._preview_after = None
+        key = self._preview_key()
+        if key[0]:
+            # Keyed, so a newer preview skips one that has not started yet
+            self.preview_io.submit(hash_password, key[0], key[2], key[1], key="preview",
+                                   on_done=lambda hashed: self._preview_ready(key, hashed))
+
+    def _preview_ready(self, key, hashed):
+        self._preview_cache[key] = hashed
+        if len(self._preview_cache) > self.PREVIEW_CACHE_SIZE:
+            self._preview_cache.popitem(last=False)
+        if key == self._preview_key():
+            self._show_hash_preview(hashed)
+
+    def _show_hash_preview(self, hashed):
+        h = hashed["password_hash"]
+        # Format with spaces for readability
+        step = len(h) // 4
+        formatted = "  ".join([h[i:i+step] for i in range(0, len(h), step)])
+        self.hash_preview.config(
+            text=f"{hashed['hash_algo']} → {formatted}",
+            fg=C["accent2"]
+        )
 
     def _add_entry(self):
         user  = self.add_user.get().strip()
@@ -517,15 +763,18 @@ class VaultApp:
         if pw != pw2:
             self.toast.show("Passwords do not match", "warning"); return
 
-        entry = add_entry(user, pw, label)
-        self.toast.show(f"Credential stored for '{user}'", "success")
-        self._clear_add_form()
-        self._refresh_vault_list()
+        def _stored(entry):
+            self.toast.show(f"Credential stored for '{user}'", "success")
+            self._preview_salt = os.urandom(16).hex()
+            self._clear_add_form()
+        self.io.submit(add_entry, user, pw, label, self._preview_salt, on_done=_stored)
 
     def _clear_add_form(self):
         for w in [self.add_user, self.add_pass, self.add_pass2, self.add_label]:
             w.clear()
-        self.hash_preview.config(text="Type password to preview hash...", fg=C["text_dim"])
+        # Drop the cached plain-text passwords along with the form
+        self._preview_cache.clear()
+        self._update_hash_preview()
 
     # ── TAB: LOOKUP ───────────────────────────────────────────────────────────
     def _build_lookup_tab(self, parent):
@@ -588,8 +837,9 @@ class VaultApp:
         if not user or not pw:
             self.toast.show("Fill in both fields", "warning"); return
 
-        entry = lookup_entry(user, pw)
+        self.io.submit(lookup_entry, user, pw, on_done=self._show_lookup, key="lookup")
 
+    def _show_lookup(self, entry):
         # Clear previous results
         for w in self.result_panel.winfo_children():
             w.destroy()
@@ -612,6 +862,7 @@ class VaultApp:
             ("USERNAME",       entry["username"],       C["accent"]),
             ("USERNAME HASH",  entry["username_hash"],  C["text_muted"]),
             ("PASSWORD HASH",  entry["password_hash"],  C["text_muted"]),
+            ("HASH SCHEME",    f"{entry['hash_algo']} {entry['hash_params']}".strip(), C["text_muted"]),
             ("LABEL / SITE",   entry["label"],          C["accent2"]),
             ("STORED ON",      entry["created"],        C["text_muted"]),
         ]
@@ -632,7 +883,8 @@ class VaultApp:
         seg_row = tk.Frame(pad, bg=C["input_bg"])
         seg_row.pack(anchor="w", pady=(4, 0))
         h = entry["password_hash"]
-        for i, seg in enumerate([h[0:8], h[8:16], h[16:24], h[24:32]]):
+        step = len(h) // 4
+        for i, seg in enumerate([h[i:i+step] for i in range(0, len(h), step)]):
             tk.Label(seg_row, text=seg, fg=C["accent2"], bg=C["tag_bg"],
                      font=("Courier New", 9), padx=8, pady=4,
                      highlightbackground=C["accent2"], highlightthickness=1
@@ -684,125 +936,220 @@ class VaultApp:
 
         tk.Frame(inner, bg=C["border"], height=1).pack(fill="x")
 
+        # Filter box — words match the start of username/label words
+        filter_row = tk.Frame(inner, bg=C["card"], padx=24, pady=12)
+        filter_row.pack(fill="x")
+        self.vault_filter = StyledEntry(
+            filter_row, label="Filter",
+            placeholder="words   label:GitHub   from:2024-01   to:2024-06-30")
+        self.vault_filter.pack(fill="x")
+        self.vault_filter.entry.bind("<KeyRelease>", self._update_filter)
+
         # Table header
         hdr = tk.Frame(inner, bg=C["tag_bg"], padx=24, pady=8)
         hdr.pack(fill="x")
         cols = [("#", 3), ("USERNAME", 12), ("LABEL", 10), ("USERNAME HASH", 20), ("PASSWORD HASH", 20), ("CREATED", 14)]
+        self._sort_headers = {}
         for col, w in cols:
-            tk.Label(hdr, text=col, fg=C["text_muted"], bg=C["tag_bg"],
-                     font=("Courier New", 8, "bold"), width=w, anchor="w").pack(side="left", padx=4)
-
-        # Scrollable list
-        list_container = tk.Frame(inner, bg=C["card"])
-        list_container.pack(fill="both", expand=True)
-
-        canvas = tk.Canvas(list_container, bg=C["card"], highlightthickness=0)
-        scrollbar = tk.Scrollbar(list_container, orient="vertical", command=canvas.yview)
-        canvas.configure(yscrollcommand=scrollbar.set)
-
-        scrollbar.pack(side="right", fill="y")
-        canvas.pack(side="left", fill="both", expand=True)
-
-        self.vault_frame = tk.Frame(canvas, bg=C["card"])
-        self.vault_window = canvas.create_window((0, 0), window=self.vault_frame, anchor="nw")
-
-        self.vault_frame.bind("<Configure>",
-            lambda e: canvas.configure(scrollregion=canvas.bbox("all")))
-        canvas.bind("<Configure>",
-            lambda e: canvas.itemconfig(self.vault_window, width=e.width))
-        canvas.bind_all("<MouseWheel>",
-            lambda e: canvas.yview_scroll(int(-1*(e.delta/120)), "units"))
-
-        self._canvas = canvas
-        self._selected_idx = tk.IntVar(value=-1)
+            lbl = tk.Label(hdr, text=col, fg=C["text_muted"], bg=C["tag_bg"],
+                           font=("Courier New", 8, "bold"), width=w, anchor="w")
+            lbl.pack(side="left", padx=4)
+            field = col.lower()
+            if field in self.SORTABLE:
+                # Click cycles ascending → descending → file order
+                lbl.config(cursor="hand2")
+                lbl.bind("<Button-1>", lambda e, f=field: self._toggle_sort(f))
+                self._sort_headers[field] = (lbl, col)
+
+        # Virtualized list — only the rows on screen exist as widgets
+        self.vault_list = VirtualList(
+            inner, formatter=self._format_vault_row, key=lambda e: e["id"],
+            on_select=self._select_vault_row,
+            empty_text="◈  Vault is empty\nAdd credentials using the 'Add Entry' tab")
+        self.vault_list.pack(fill="both", expand=True)
+        self._selected_id = self.vault_list.selected
+        self._vault_entries = []
+        self._vault_by_id   = {}
+        self._filter        = None    # active search_entries() arguments
+        self._sort          = None    # (field, descending) or None for file order
+        self._filter_after  = None
+        self._view          = []      # rows shown while filtered or sorted
 
         # DB path bar
         db_bar = tk.Frame(inner, bg=C["input_bg"], padx=24, pady=6)
         db_bar.pack(fill="x")
-        tk.Label(db_bar, text=f"◈  Database: {DB_FILE}", fg=C["text_dim"],
+        tk.Label(db_bar, text=f"◈  Database: {vault_core.DB_FILE}", fg=C["text_dim"],
                  bg=C["input_bg"], font=("Courier New", 8)).pack(side="left")
 
         return frame
 
     def _refresh_vault_list(self):
-        for w in self.vault_frame.winfo_children():
-            w.destroy()
-
-        entries = load_db()
-        self.entry_count_lbl.config(text=f"  {len(entries)} credential{'s' if len(entries)!=1 else ''} stored")
-        self._selected_idx.set(-1)
-        self._vault_radios = []
+        # Keyed so a newer refresh cancels one that is still queued or running
+        self.io.submit(load_db, on_done=self._show_vault_entries, key="refresh")
+
+    def _show_vault_entries(self, entries):
+        self._vault_entries = entries
+        self._vault_by_id   = {e["id"]: e for e in entries}
+        if self._filter is not None or self._sort is not None:
+            self._run_view()
+            return
+        self._update_entry_count()
+        self.vault_list.set_rows(entries)
+
+    def _update_entry_count(self):
+        n = len(self._vault_entries)
+        text = f"  {n} credential{'s' if n!=1 else ''} stored"
+        if self._filter is not None:
+            text = f"  {len(self._view)} of {n} match"
+        self.entry_count_lbl.config(text=text)
+
+    @staticmethod
+    def _parse_filter(text):
+        """Split filter box text into search_entries() arguments, or None if empty."""
+        words, label, since, until = [], None, None, None
+        for token in text.split():
+            key, _, value = token.partition(":")
+            key = key.lower()
+            if value and key == "label":
+                label = value
+            elif value and key == "from":
+                since = value
+            elif value and key == "to":
+                until = value
+            else:
+                words.append(token)
+        if not (words or label or since or until):
+            return None
+        return " ".join(words), label, since, until
+
+    def _update_filter(self, e=None):
+        # Wait for a pause in typing; the search itself runs on the I/O thread
+        if self._filter_after is not None:
+            self.root.after_cancel(self._filter_after)
+        self._filter_after = self.root.after(self.FILTER_DEBOUNCE_MS, self._apply_filter)
+
+    def _apply_filter(self):
+        self._filter_after = None
+        query = self._parse_filter(self.vault_filter.get())
+        if query == self._filter:
+            return
+        self._filter = query
+        self._update_view()
+
+    def _toggle_sort(self, field):
+        if self._sort is None or self._sort[0] != field:
+            self._sort = (field, False)
+        elif not self._sort[1]:
+            self._sort = (field, True)
+        else:
+            self._sort = None
+        for name, (lbl, title) in self._sort_headers.items():
+            arrow = "" if self._sort is None or self._sort[0] != name else \
+                    " ▼" if self._sort[1] else " ▲"
+            lbl.config(text=title + arrow, fg=C["accent"] if arrow else C["text_muted"])
+        self._update_view()
+
+    def _update_view(self):
+        if self._filter is None and self._sort is None:
+            self._update_entry_count()
+            self.vault_list.set_rows(self._vault_entries)
+        else:
+            self._run_view()
+
+    def _run_view(self):
+        """Fetch the filtered and/or sorted rows on the I/O thread."""
+        query, order = self._filter, self._sort
+        if query is None:
+            # Walks the maintained sort index: no full sort
+            job = (query_entries,) + order
+        else:
+            job = (search_entries,) + query + (order or ())
+        # Keyed, so a newer view supersedes one that is still waiting
+        self.io.submit(*job, key="view",
+                       on_done=lambda rows: self._show_view(query, order, rows))
 
-        if not entries:
-            tk.Label(self.vault_frame, text="\n\n◈  Vault is empty\nAdd credentials using the 'Add Entry' tab",
-                     fg=C["text_dim"], bg=C["card"],
-                     font=("Courier New", 11), justify="center").pack(expand=True, pady=40)
+    def _show_view(self, query, order, rows):
+        if (query, order) != (self._filter, self._sort):
+            return
+        self._view = rows
+        selected = self._selected_id.get()
+        self.vault_list.set_rows(rows)
+        # Keep the selection when the row is still among the matches
+        if any(e["id"] == selected for e in rows):
+            self._selected_id.set(selected)
+        self._update_entry_count()
+
+    def _on_vault_change(self, kind, index, entry):
+        """Apply a storage change event to the vault tab as a one-row diff.
+
+        While filtered or sorted, the diff goes to the full list only and
+        the view is re-fetched, since its positions differ.
+        """
+        if kind == "reset":
+            self._refresh_vault_list()
+            return
+        if kind == "insert":
+            self._vault_entries.insert(index, entry)
+            self._vault_by_id[entry["id"]] = entry
+        elif kind == "update":
+            self._vault_entries[index] = entry
+            self._vault_by_id[entry["id"]] = entry
+        elif kind == "delete":
+            self._vault_entries.pop(index)
+            self._vault_by_id.pop(entry["id"], None)
+            if self._selected_id.get() == entry["id"]:
+                self._selected_id.set(-1)
+        if self._filter is not None or self._sort is not None:
+            self._run_view()
             return
+        self._update_entry_count()
+        self.vault_list.refresh()
+
+    @staticmethod
+    def _format_vault_row(i, e):
+        return [
+            (f"  {i+1}",         4, C["text_dim"]),
+            (e["username"],      14, C["accent"]),
+            (e["label"],         12, C["accent2"]),
+            (e["username_hash"], 22, C["text_muted"]),
+            (e["password_hash"], 22, C["text_muted"]),
+            (e["created"],       16, C["text_dim"]),
+        ]
 
-        for i, e in enumerate(entries):
-            row_bg = C["card"] if i % 2 == 0 else C["surface"]
-            row = tk.Frame(self.vault_frame, bg=row_bg, padx=24, pady=9,
-                           highlightbackground=C["border"], highlightthickness=0)
-            row.pack(fill="x")
-
-            # Highlight on hover
-            def _enter(ev, r=row, bg=row_bg):
-                r.config(bg=C["hover"])
-                for child in r.winfo_children(): child.config(bg=C["hover"])
-            def _leave(ev, r=row, bg=row_bg):
-                r.config(bg=bg)
-                for child in r.winfo_children(): child.config(bg=bg)
-            row.bind("<Enter>", _enter)
-            row.bind("<Leave>", _leave)
-
-            def _select(ev, idx=i, r=row):
-                self._selected_idx.set(idx)
-                self.toast.show(f"Selected entry #{idx+1}", "info")
-
-            row.bind("<Button-1>", _select)
-
-            rb = tk.Radiobutton(row, variable=self._selected_idx, value=i,
-                                 bg=row_bg, activebackground=C["hover"],
-                                 selectcolor=C["accent"],
-                                 highlightthickness=0, bd=0)
-            rb.pack(side="left")
-            rb.bind("<Button-1>", _select)
-            self._vault_radios.append(rb)
-
-            data = [
-                (f"  {i+1}", 4, C["text_dim"]),
-                (e["username"],      14, C["accent"]),
-                (e["label"],         12, C["accent2"]),
-                (e["username_hash"], 22, C["text_muted"]),
-                (e["password_hash"], 22, C["text_muted"]),
-                (e["created"],       16, C["text_dim"]),
-            ]
-            for text, w, color in data:
-                tk.Label(row, text=text[:w*1], fg=color, bg=row_bg,
-                          font=("Courier New", 9), width=w, anchor="w"
-                          ).pack(side="left", padx=3)
+    def _select_vault_row(self, idx):
+        self.toast.show(f"Selected entry #{idx+1}", "info")
 
     def _delete_selected(self):
-        idx = self._selected_idx.get()
-        if idx < 0:
+        entry_id = self._selected_id.get()
+        if entry_id < 0:
             self.toast.show("Select an entry to delete", "warning"); return
-        entries = load_db()
-        if idx >= len(entries):
+        entry = self._vault_by_id.get(entry_id)
+        if entry is None:
             self.toast.show("Invalid selection", "error"); return
 
-        name = entries[idx]["username"]
+        name = entry["username"]
         if messagebox.askyesno(
             "Confirm Delete",
             f"Delete credential for '{name}'?\nThis cannot be undone.",
             parent=self.root
         ):
-            delete_entry(idx)
-            self.toast.show(f"Deleted entry for '{name}'", "success")
-            self._refresh_vault_list()
+            self.io.submit(delete_entry, entry_id,
+                on_done=lambda gone: self.toast.show(f"Deleted entry for '{name}'", "success")
+                    if gone else self.toast.show(f"'{name}' was already deleted", "warning"))
 
     # ── RUN ───────────────────────────────────────────────────────────────────
     def run(self):
         self.root.mainloop()
+        # The widgets are gone now, so nothing here may go through submit()
+        # (it reports busy state to the status label)
+        try:
+            self.migration.stop()
+        finally:
+            try:
+                self.io.close()        # drains the writes still queued
+                vault_core.flush()     # then syncs a group commit they left pending
+            finally:
+                self.preview_io.close()
 
 
 # ─── ENTRY POINT ─────────────────────────────────────────────────────────────
@@ -0,0 +1,216 @@
+"""
+VAULT — storage benchmarks
+
+Generates synthetic vaults in a temporary DB_FILE and times the storage
+hot paths (load_db, save_db, add_entry, lookup_entry, query_entries,
+delete_entry) for each backend. Reports latency percentiles, throughput
+and peak traced memory per operation, and can write the results as JSON
+so runs can be diffed to catch regressions or compare backends.
+
+With --compression, the XML backends run once per codec, and the report
+adds xml_parse (decompressing and parsing the XML snapshots, which the
+binary snapshot otherwise spares cold loads) and the size on disk.
+
+Usage:
+    python vault_bench.py                              # 1k / 10k / 100k, all backends
+    python vault_bench.py --sizes 1000,1000000 --backends journal
+    python vault_bench.py --json results.json
+    python vault_bench.py --json - > results.json       # table on stderr
+    python vault_bench.py --sizes 10000,100000,1000000 --backends journal --compression none,gzip,lzma
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import vault_core
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+
+
+def synth_entries(n: int, seed: int = 0) -> list[dict]:
+    """Build `n` realistic-looking entries without touching storage."""
+    rnd = random.Random(seed)
+    labels = ["Gmail", "GitHub", "Bank", "Work", "Shop", "Default"]
+    return [{
+        "username":      f"user{i:07d}",
+        "username_hash": vault_core.md5_hash(f"user{i:07d}"),
+        "password_hash": vault_core.md5_hash(f"pw{i}"),
+        "created":       f"2024-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d} 12:00:00",
+        "label":         rnd.choice(labels),
+    } for i in range(n)]
+
+
+def _measure(fn, repeat: int, setup=None) -> dict:
+    """Time `repeat` calls of fn(), then one traced call for peak memory."""
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+
+    if setup:
+        setup()
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    samples.sort()
+    total = sum(samples)
+    return {
+        "samples":   len(samples),
+        "p50_ms":    vault_core.percentile(samples, 50) * 1e3,
+        "p95_ms":    vault_core.percentile(samples, 95) * 1e3,
+        "p99_ms":    vault_core.percentile(samples, 99) * 1e3,
+        "max_ms":    samples[-1] * 1e3,
+        "ops_per_s": len(samples) / total if total else float("inf"),
+        "peak_mb":   peak / 1e6,
+    }
+
+
+def _cold():
+    """Drop the resident storage so the next call reads from disk."""
+    vault_core._storage = None
+
+
+def _xml_files(workdir: str) -> list[str]:
+    """The XML snapshots a backend keeps under `workdir` (none for SQLite)."""
+    return [os.path.join(root, f) for root, _, files in os.walk(workdir)
+            for f in files if f.endswith(".xml")]
+
+
+def bench(backend: str, size: int, repeat: int, heavy_repeat: int,
+          compression: str = None) -> dict:
+    """Run every operation against one backend at one vault size."""
+    workdir = tempfile.mkdtemp(prefix="vault_bench_")
+    vault_core.DB_FILE = os.path.join(workdir, "vault_database.xml")
+    vault_core.STORAGE_BACKEND = backend
+    vault_core.COMPRESSION = compression
+    try:
+        entries = synth_entries(size)
+        rnd = random.Random(1)
+        _cold()
+        vault_core.save_db(entries)
+        # Full rewrites per mutation make the xml backend's writes "heavy" too
+        write_repeat = heavy_repeat if backend == "xml" else repeat
+
+        ops = {}
+        ops["save_db"] = _measure(lambda: vault_core.save_db(entries), heavy_repeat)
+        ops["load_db_cold"] = _measure(vault_core.load_db, heavy_repeat, setup=_cold)
+        vault_core.load_db()
+        ops["load_db_warm"] = _measure(vault_core.load_db, repeat)
+        snapshots = _xml_files(workdir)
+        if snapshots:
+            ops["xml_parse"] = _measure(lambda: [vault_core._read_xml(f) for f in snapshots],
+                                        heavy_repeat)
+        xml_bytes = sum(map(os.path.getsize, snapshots))
+
+        def hit():
+            i = rnd.randrange(size)
+            vault_core.lookup_entry(f"user{i:07d}", f"pw{i}")
+        ops["lookup_hit"] = _measure(hit, repeat)
+        ops["lookup_miss"] = _measure(lambda: vault_core.lookup_entry("nobody", "nothing"), repeat)
+        ops["lookup_cold"] = _measure(lambda: vault_core.lookup_entry("nobody", "nothing"),
+                                      heavy_repeat, setup=_cold)
+
+        vault_core.load_db()
+        ops["query_page"] = _measure(
+            lambda: vault_core.query_entries("label", limit=50, offset=rnd.randrange(size)), repeat)
+        page = vault_core.query_entries("created", limit=50)
+        ops["query_keyset"] = _measure(
+            lambda: vault_core.query_entries("created", limit=50, after=page[-1]), repeat)
+
+        vault_core.load_db()
+        counter = iter(range(10**9))
+        ops["add_entry"] = _measure(
+            lambda: vault_core.add_entry(f"bench{next(counter)}", "pw", "Bench"), write_repeat)
+        victims = [e["id"] for e in vault_core.load_db()]
+        rnd.shuffle(victims)
+        ops["delete_entry"] = _measure(
+            lambda: vault_core.delete_entry(victims.pop()), write_repeat)
+
+        vault_core.get_storage()    # make sure every backend file is in place
+        disk = sum(os.path.getsize(os.path.join(root, f))
+                   for root, _, files in os.walk(workdir) for f in files)
+        return {"backend": backend, "size": size, "compression": compression or "none",
+                "ops": ops, "xml_bytes": xml_bytes, "disk_bytes": disk}
+    finally:
+        _cold()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _print_table(results: list[dict], file=None):
+    print(f"{'backend':<9}{'size':>10}  {'codec':<6}{'operation':<14}{'p50 ms':>10}{'p95 ms':>10}"
+          f"{'p99 ms':>10}{'ops/s':>12}{'peak MB':>10}", file=file)
+    for r in results:
+        for op, m in r["ops"].items():
+            print(f"{r['backend']:<9}{r['size']:>10}  {r['compression']:<6}{op:<14}"
+                  f"{m['p50_ms']:>10.3f}{m['p95_ms']:>10.3f}{m['p99_ms']:>10.3f}"
+                  f"{m['ops_per_s']:>12.1f}{m['peak_mb']:>10.2f}", file=file)
+    print(f"\n{'backend':<9}{'size':>10}  {'codec':<6}{'XML MB':>10}{'disk MB':>10}", file=file)
+    for r in results:
+        print(f"{r['backend']:<9}{r['size']:>10}  {r['compression']:<6}"
+              f"{r['xml_bytes'] / 1e6:>10.2f}{r['disk_bytes'] / 1e6:>10.2f}", file=file)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="vault_bench", description="VAULT storage benchmarks")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="comma-separated vault sizes (e.g. 1000,10000,100000,1000000)")
+    parser.add_argument("--backends", default=",".join(vault_core._BACKENDS),
+                        help="comma-separated storage backends")
+    parser.add_argument("--repeat", type=int, default=200,
+                        help="samples for cheap operations")
+    parser.add_argument("--heavy-repeat", type=int, default=3,
+                        help="samples for whole-file operations (save, cold load)")
+    parser.add_argument("--compression", default="none",
+                        help="comma-separated XML codecs to compare: none, gzip, lzma")
+    parser.add_argument("--hash-algo", default="md5", choices=sorted(vault_core._HASHERS),
+                        help="password hashing for added entries; md5 keeps the numbers "
+                             "about storage rather than KDF cost")
+    parser.add_argument("--json", metavar="PATH", help="write machine-readable results ('-' for stdout)")
+    args = parser.parse_args(argv)
+    vault_core.HASH_ALGO = args.hash_algo
+
+    results = []
+    for backend in args.backends.split(","):
+        for size in (int(s) for s in args.sizes.split(",")):
+            for codec in args.compression.split(","):
+                if codec != "none" and backend == "sqlite":
+                    continue    # keeps no XML to compress
+                print(f"· {backend} @ {size:,} entries, {codec}", file=sys.stderr)
+                results.append(bench(backend, size, args.repeat, args.heavy_repeat,
+                                     None if codec == "none" else codec))
+
+    # With the JSON on stdout the table goes to stderr, so the JSON still parses
+    _print_table(results, sys.stderr if args.json == "-" else sys.stdout)
+    if args.json:
+        report = {
+            "timestamp": datetime.now().isoformat(),
+            "python":    platform.python_version(),
+            "platform":  platform.platform(),
+            "hash_algo": args.hash_algo,
+            "results":   results,
+        }
+        if args.json == "-":
+            json.dump(report, sys.stdout, indent=2)
+            print()
+        else:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
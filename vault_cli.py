@@ -0,0 +1,227 @@
+"""
+VAULT — headless command line
+
+Bulk import/export and maintenance for the vault database without
+opening the GUI or importing tkinter, so it can run in scripts,
+pipelines and on headless servers.
+
+Usage:
+    python vault_cli.py import credentials.csv
+    python vault_cli.py export backup.jsonl
+    python vault_cli.py export backup.xml.gz
+    python vault_cli.py count
+    python vault_cli.py verify
+    python vault_cli.py migrate                        # XML vault → SQLite
+    python vault_cli.py rehash                         # MD5 hashes → current KDF
+    python vault_cli.py --db /path/to/vault.xml export - --format csv
+
+Formats are picked from the file extension (.csv, .jsonl, .xml) or with
+--format; XML files ending .gz or .xz are gzip/xz compressed. Rows carrying a `password` column are hashed on import, as one
+batch spread over all CPU cores (vault_core.HASH_WORKERS); rows
+that already carry `username_hash`/`password_hash` (an earlier export)
+are stored as they are, under fresh ids. "-" reads stdin / writes stdout for csv and jsonl.
+"""
+
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+
+import vault_core as vault
+
+FORMATS = ("csv", "jsonl", "xml")
+_HEX = re.compile(r"^[0-9a-f]*$")
+_DIGEST_LEN = {"md5": 32, "pbkdf2_sha256": 64, "scrypt": 64,
+               "pbkdf2_sha256_md5": 64, "scrypt_md5": 64}
+
+
+def _detect_format(path: str, fmt: str = None) -> str:
+    if fmt:
+        return fmt
+    root, ext = os.path.splitext(path.lower())
+    if vault._compression_of(path):
+        # Only XML is read and written compressed (backup.xml.gz, backup.xml.xz)
+        root, ext = os.path.splitext(root)
+        if ext == ".xml":
+            return "xml"
+    elif ext.lstrip(".") in FORMATS:
+        return ext.lstrip(".")
+    raise SystemExit(f"Cannot tell the format of '{path}', pass --format {{{','.join(FORMATS)}}}")
+
+
+def _open(path: str, mode: str):
+    if path == "-":
+        return sys.stdin if "r" in mode else sys.stdout
+    return open(path, mode, encoding="utf-8", newline="")
+
+
+def _read_rows(path: str, fmt: str):
+    if fmt == "xml":
+        yield from vault._iter_xml(path)
+        return
+    f = _open(path, "r")
+    try:
+        if fmt == "csv":
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError as exc:
+                        yield exc    # cmd_import reports it as a skipped row
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def _row_problem(row):
+    """Why an import row cannot be stored, or None. A row without a password
+    must also pass _problems(), as an exported entry."""
+    if isinstance(row, json.JSONDecodeError):
+        return f"not valid JSON ({row.msg})"
+    if not isinstance(row, dict):
+        return "not a JSON object"
+    username, password, label = row.get("username"), row.get("password"), row.get("label")
+    if not isinstance(username, str) or not username.strip():
+        return "no username"
+    if password is not None and not isinstance(password, str):
+        return "password is not text"
+    if label is not None and not isinstance(label, str):
+        return "label is not text"
+    try:
+        vault.check_text("username", username)
+        vault.check_text("label", label or "")
+    except ValueError as exc:
+        return str(exc)
+    if not password:
+        problems = list(_problems(row))
+        if problems:
+            return f"no password, and {problems[0]}"
+    return None
+
+
+def _problems(e):
+    """Yield what is wrong with stored (hashed) entry `e`, one message each."""
+    if e.get("username_hash") != vault.md5_hash(e.get("username") or ""):
+        yield "username_hash does not match username"
+    algo = e.get("hash_algo") or "md5"
+    password_hash = e.get("password_hash") or ""
+    if algo not in _DIGEST_LEN:
+        yield f"unknown hash_algo '{algo}'"
+    elif len(password_hash) != _DIGEST_LEN[algo] or not _HEX.match(password_hash):
+        yield f"password_hash is not a {algo} digest"
+    elif algo != "md5" and not (e.get("salt") and _HEX.match(e["salt"])):
+        yield f"{algo} entry has no salt"
+
+
+# ─── COMMANDS ─────────────────────────────────────────────────────────────────
+def cmd_import(args) -> int:
+    """Add the rows of a file; exit status 1 if any had to be skipped."""
+    credentials, hashed, skipped = [], [], 0
+    for n, row in enumerate(_read_rows(args.file, _detect_format(args.file, args.format)), 1):
+        problem = _row_problem(row)
+        if problem:
+            skipped += 1
+            print(f"row {n} skipped: {problem}", file=sys.stderr)
+        elif row.get("password"):
+            credentials.append((row["username"], row["password"], row.get("label") or ""))
+        else:
+            hashed.append(row)    # already hashed, e.g. from an export
+    added = len(vault.add_entries(credentials)) if credentials else 0
+    added += vault.import_entries(hashed) if hashed else 0
+    print(f"imported {added} entries" + (f", skipped {skipped}" if skipped else ""),
+          file=sys.stderr)
+    return 1 if skipped else 0
+
+
+def cmd_export(args) -> int:
+    fmt = _detect_format(args.file, args.format)
+    if fmt == "xml":
+        vault.export_xml(args.file)
+        return 0
+    f = _open(args.file, "w")
+    try:
+        if fmt == "csv":
+            writer = csv.DictWriter(f, fieldnames=("id",) + vault.ENTRY_FIELDS,
+                                    extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(vault.iter_entries())
+        else:
+            for e in vault.iter_entries():
+                f.write(json.dumps(e.to_dict()) + "\n")
+    finally:
+        if f is not sys.stdout:
+            f.close()
+    return 0
+
+
+def cmd_count(args) -> int:
+    print(sum(1 for _ in vault.iter_entries()))
+    return 0
+
+
+def cmd_verify(args) -> int:
+    """Check every entry is well formed; exit status 1 if any is not."""
+    problems = total = 0
+    for total, e in enumerate(vault.iter_entries(), 1):
+        for problem in _problems(e):
+            problems += 1
+            print(f"entry id {e['id']}: {problem}", file=sys.stderr)
+    print(f"{total} entries checked, {problems} problem{'s' if problems != 1 else ''}")
+    return 1 if problems else 0
+
+
+def cmd_rehash(args) -> int:
+    def progress(done, total, rate):
+        print(f"\r{done}/{total} entries upgraded, {rate:.1f}/s", end="", file=sys.stderr)
+    n = vault.HashMigration(on_progress=progress, batch_size=args.batch).run()
+    if n:
+        print(file=sys.stderr)
+    print(f"upgraded {n} legacy MD5 entries to {vault.HASH_ALGO}", file=sys.stderr)
+    return 0
+
+
+def cmd_migrate(args) -> int:
+    n = vault.migrate_xml_to_sqlite()
+    print(f"migrated {n} entries to {os.path.splitext(vault.DB_FILE)[0]}.sqlite3", file=sys.stderr)
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="vault_cli", description="Headless VAULT maintenance")
+    parser.add_argument("--db", help=f"vault file (default: {vault.DB_FILE})")
+    parser.add_argument("--backend", choices=sorted(vault._BACKENDS),
+                        help=f"storage backend (default: {vault.STORAGE_BACKEND})")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("import", help="add entries from a csv/jsonl/xml file")
+    p.add_argument("file")
+    p.add_argument("--format", choices=FORMATS)
+    p.set_defaults(func=cmd_import)
+
+    p = sub.add_parser("export", help="write all entries to a csv/jsonl/xml file")
+    p.add_argument("file")
+    p.add_argument("--format", choices=FORMATS)
+    p.set_defaults(func=cmd_export)
+
+    sub.add_parser("count", help="print the number of entries").set_defaults(func=cmd_count)
+    sub.add_parser("verify", help="check every entry is well formed").set_defaults(func=cmd_verify)
+    sub.add_parser("migrate", help="copy the XML vault into the SQLite backend").set_defaults(func=cmd_migrate)
+
+    p = sub.add_parser("rehash", help="upgrade legacy MD5 password hashes to the current KDF")
+    p.add_argument("--batch", type=int, help=f"entries per write (default: {vault.MIGRATE_BATCH})")
+    p.set_defaults(func=cmd_rehash)
+
+    args = parser.parse_args(argv)
+    if args.db:
+        vault.DB_FILE = os.path.abspath(args.db)
+    if args.backend:
+        vault.STORAGE_BACKEND = args.backend
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
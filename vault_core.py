@@ -0,0 +1,2747 @@
+"""
+╔══════════════════════════════════════════════════════════════╗
+║         VAULT — Core: hashing, storage and index             ║
+╚══════════════════════════════════════════════════════════════╝
+
+The headless half of VAULT. Nothing here imports tkinter, so services,
+scripts and vault_cli.py can use the vault on servers without a display.
+The GUI lives in password_vault.py and is built on top of this module.
+
+Configure by assigning the module globals below before first use,
+e.g. `vault_core.DB_FILE = "/srv/vault.xml"`.
+"""
+
+import bisect
+import copy
+import hashlib
+import heapq
+import hmac
+import io
+import itertools
+import json
+import math
+import mmap
+import operator
+import os
+import re
+import shutil
+import struct
+import sys
+import threading
+import time
+import zlib
+from collections.abc import Mapping
+from contextlib import ExitStack, contextmanager
+from datetime import datetime
+from xml.parsers import expat
+
+try:
+    import fcntl
+except ImportError:    # Windows
+    fcntl = None
+    import msvcrt
+
+# ─── CONFIG ──────────────────────────────────────────────────────────────────
+DB_FILE = os.path.join(os.path.expanduser("~"), "vault_database.xml")
+STORAGE_BACKEND = "journal"      # "journal" (append-only + snapshot), "xml" (full rewrite), "sqlite" or "sharded"
+JOURNAL_COMPACT_EVERY = 1000     # journal records before folding them into the XML snapshot
+PRETTY_XML = True                # indented XML; False writes compact single-line entries
+FSYNC = True                     # fsync snapshots and journal records before reporting success
+GROUP_COMMIT_WINDOW = 0.0        # seconds; > 0 coalesces journal fsyncs issued within the window
+# Password hashing for new entries: "scrypt", "pbkdf2_sha256" or "md5" (legacy, unsalted)
+HASH_ALGO = "scrypt" if hasattr(hashlib, "scrypt") else "pbkdf2_sha256"
+HASH_PARAMS = {"scrypt": {"n": 2 ** 14, "r": 8, "p": 1},
+               "pbkdf2_sha256": {"iterations": 600_000}}
+HASH_WORKERS = None              # processes for bulk hashing; None = one per CPU, 1 = inline
+MIGRATE_BATCH = 256              # legacy MD5 entries upgraded per background write
+BLOOM_FP_RATE = 0.01             # false-positive rate of the username filter; 0 disables it
+BINARY_SNAPSHOT = True           # mirror each XML snapshot in <DB_FILE>.snap for fast cold starts
+SHARDS = 16                      # journal vaults the "sharded" backend splits entries over, by username hash
+COMPRESSION = None               # "gzip" or "lzma" to compress XML snapshots; a .gz/.xz DB_FILE implies it
+COMPRESSION_LEVEL = None         # gzip level 1-9 / lzma preset 0-9; None = 6 for gzip, 1 for lzma
+
+# ─── HASHING ENGINE ───────────────────────────────────────────────────────────
+def md5_hash(text: str) -> str:
+    return hashlib.md5(text.encode("utf-8")).hexdigest()
+
+
+def _kdf_md5(password: str, salt: bytes, params: dict) -> str:
+    return md5_hash(password)
+
+
+def _kdf_pbkdf2_sha256(password: str, salt: bytes, params: dict) -> str:
+    return hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt,
+                               params["iterations"]).hex()
+
+
+def _kdf_scrypt(password: str, salt: bytes, params: dict) -> str:
+    n, r, p = params["n"], params["r"], params["p"]
+    return hashlib.scrypt(password.encode("utf-8"), salt=salt, n=n, r=r, p=p,
+                          maxmem=256 * n * r * p + 2 ** 20, dklen=32).hex()
+
+
+def _over_md5(kdf):
+    """KDF applied to the password's MD5 digest: how a legacy MD5 hash is
+    upgraded when only the hash, not the password, is at hand."""
+    def kdf_md5(password: str, salt: bytes, params: dict) -> str:
+        return kdf(md5_hash(password), salt, params)
+    return kdf_md5
+
+
+# name → (function, salt bytes, cheap enough to run inline)
+_HASHERS = {
+    "md5":               (_kdf_md5, 0, True),
+    "pbkdf2_sha256":     (_kdf_pbkdf2_sha256, 16, False),
+    "scrypt":            (_kdf_scrypt, 16, False),
+    "pbkdf2_sha256_md5": (_over_md5(_kdf_pbkdf2_sha256), 16, False),
+    "scrypt_md5":        (_over_md5(_kdf_scrypt), 16, False),
+}
+
+
+def _encode_params(params: dict) -> str:
+    return ",".join(f"{k}={v}" for k, v in sorted(params.items()))
+
+
+def _decode_params(text: str) -> dict:
+    return {k: int(v) for k, v in (item.split("=") for item in text.split(",") if item)}
+
+
+def _hash_job(job) -> dict:
+    """(password, algo, params, salt hex or None) → the hash fields of an entry.
+
+    Top-level so it can run in a worker process; the params travel with the
+    job because a spawned worker does not see the parent's HASH_PARAMS.
+    """
+    password, algo, params, salt = job
+    kdf, salt_len, _ = _HASHERS[algo]
+    if salt is None or not salt_len:
+        salt = os.urandom(salt_len).hex()
+    return {
+        "password_hash": kdf(password, bytes.fromhex(salt), params),
+        "hash_algo":     algo,
+        "salt":          salt,
+        "hash_params":   _encode_params(params),
+    }
+
+
+def _verify_job(job) -> bool:
+    password, entry = job
+    algo = entry.get("hash_algo") or "md5"
+    kdf = _HASHERS[algo][0]
+    digest = kdf(password, bytes.fromhex(entry.get("salt") or ""),
+                 _decode_params(entry.get("hash_params") or ""))
+    return hmac.compare_digest(digest, entry["password_hash"])
+
+
+_pool = None
+
+
+def _hash_pool():
+    """Process pool for KDF work, started on first use.
+
+    Uses spawn rather than fork so it is safe to start from a process that
+    already runs threads (the GUI's I/O worker, group-commit timers).
+    """
+    global _pool
+    if _pool is None:
+        import multiprocessing    # deferred, like the pool: most runs never hash in bulk
+        from concurrent.futures import ProcessPoolExecutor
+        _pool = ProcessPoolExecutor(max_workers=HASH_WORKERS,
+                                    mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def _run_jobs(fn, jobs: list, cheap: bool) -> list:
+    """Map fn over jobs, in the process pool when the work is worth shipping."""
+    workers = HASH_WORKERS or os.cpu_count() or 1
+    if cheap or len(jobs) < 2 or workers == 1:
+        return [fn(job) for job in jobs]
+    chunk = max(1, len(jobs) // (workers * 4))
+    return list(_hash_pool().map(fn, jobs, chunksize=chunk))
+
+
+def hash_password(password: str, algo: str = None, salt: str = None) -> dict:
+    """Hash one password with `algo` (default HASH_ALGO) and a fresh salt.
+
+    Returns the entry fields password_hash, hash_algo, salt and hash_params.
+    Runs inline: a single KDF call is bounded by HASH_PARAMS.
+    """
+    algo = algo or HASH_ALGO
+    return _hash_job((password, algo, HASH_PARAMS.get(algo, {}), salt))
+
+
+def hash_passwords(passwords, algo: str = None) -> list[dict]:
+    """hash_password for many passwords, spread over HASH_WORKERS processes."""
+    algo = algo or HASH_ALGO
+    params = HASH_PARAMS.get(algo, {})
+    return _run_jobs(_hash_job, [(pw, algo, params, None) for pw in passwords],
+                     _HASHERS[algo][2])
+
+
+def verify_password(password: str, entry: dict) -> bool:
+    """Check `password` against an entry under the entry's own algorithm."""
+    return _verify_job((password, entry))
+
+
+def verify_passwords(pairs) -> list[bool]:
+    """Batch verify_password over (password, entry) pairs, in parallel for KDFs."""
+    pairs = list(pairs)
+    cheap = all(_HASHERS[e.get("hash_algo") or "md5"][2] for _, e in pairs)
+    return _run_jobs(_verify_job, pairs, cheap)
+
+
+def needs_rehash(entry: dict) -> bool:
+    """True if the entry was hashed with another algorithm or weaker parameters."""
+    return ((entry.get("hash_algo") or "md5") != HASH_ALGO
+            or _decode_params(entry.get("hash_params") or "") != HASH_PARAMS.get(HASH_ALGO, {}))
+
+
+# ─── DATABASE LAYER ───────────────────────────────────────────────────────────
+class VaultCorruptError(Exception):
+    """The vault file exists but cannot be parsed."""
+
+
+ENTRY_FIELDS = ("username", "username_hash", "password_hash", "created", "label",
+                "hash_algo", "salt", "hash_params")
+# Besides these, every stored entry carries an integer "id" that never changes
+# and is never reused, persisted as the <entry id="…"> attribute.
+_NO_STAMP = -1    # sort key of a `created` text that is not a timestamp
+
+
+def _pack_hex(text: str):
+    """Raw bytes for a lower-case hex digest; anything else is kept as given."""
+    try:
+        raw = bytes.fromhex(text)
+    except ValueError:
+        return text
+    return raw if raw.hex() == text else text
+
+
+def _unpack_hex(value) -> str:
+    return value.hex() if type(value) is bytes else value
+
+
+def _pack_stamp(text: str):
+    """`created` as the int YYYYMMDDhhmmss; anything else is kept as given."""
+    if len(text) == 19 and text[4::3] == "-- ::":     # cheaper than a regex, once per entry
+        digits = text.replace("-", "").replace(" ", "").replace(":", "")
+        if len(digits) == 14 and digits.isascii() and digits.isdigit():
+            return int(digits)
+    return text
+
+
+def _unpack_stamp(value) -> str:
+    if type(value) is not int:
+        return value
+    s = f"{value:014d}"
+    return f"{s[:4]}-{s[4:6]}-{s[6:8]} {s[8:10]}:{s[10:12]}:{s[12:]}"
+
+
+def _stamp_range(since: str = None, until: str = None) -> tuple[int, int]:
+    """[low, high) of packed `created` values for inclusive date prefixes.
+
+    "2024-03" as `since` means 20240300000000, as `until` everything up
+    to 20240400000000. Texts that are not timestamps fall outside any
+    range with a bound.
+    """
+    low, high = _NO_STAMP, 10 ** 14
+    if since or until:
+        low = 0
+    since, until = re.sub(r"[^0-9]", "", since or "")[:14], re.sub(r"[^0-9]", "", until or "")[:14]
+    if since:
+        low = int(since.ljust(14, "0"))
+    if until:
+        high = (int(until) + 1) * 10 ** (14 - len(until))
+    return low, high
+
+
+class Entry(Mapping):
+    """Compact resident form of a vault entry.
+
+    Reads like a read-only dict of "id" plus ENTRY_FIELDS (e["label"],
+    e.get(…), dict(e)), but keeps the hex digests and salt as raw bytes,
+    `created` as the int YYYYMMDDhhmmss and the label, algorithm and
+    params as interned strings shared by every entry and every reload:
+    about a third of the memory of the dict. A value that does not fit
+    the packed form (say an imported digest in upper case) is kept as
+    given. Only `id` is ever assigned after construction, by storage.
+    """
+    __slots__ = ("id", "username", "_username_hash", "_password_hash", "_created",
+                 "label", "hash_algo", "_salt", "hash_params")
+    KEYS = ("id",) + ENTRY_FIELDS
+    _KEYSET = frozenset(KEYS)
+
+    def __init__(self, id: int = None, username: str = "", username_hash: str = "",
+                 password_hash: str = "", created: str = "", label: str = "",
+                 hash_algo: str = "", salt: str = "", hash_params: str = ""):
+        self.id             = id
+        self.username       = username
+        self._username_hash = _pack_hex(username_hash)
+        self._password_hash = _pack_hex(password_hash)
+        self._created       = _pack_stamp(created)
+        self.label          = sys.intern(label)
+        self.hash_algo      = sys.intern(hash_algo or "md5")    # empty in pre-KDF vaults
+        self._salt          = _pack_hex(salt)
+        self.hash_params    = sys.intern(hash_params)
+
+    @classmethod
+    def of(cls, entry) -> "Entry":
+        """`entry` itself if it is an Entry, else a packed copy of the mapping."""
+        if type(entry) is cls:
+            return entry
+        return cls(entry.get("id"), *(str(entry.get(key) or "") for key in ENTRY_FIELDS))
+
+    @property
+    def username_hash(self) -> str:
+        return _unpack_hex(self._username_hash)
+
+    @property
+    def password_hash(self) -> str:
+        return _unpack_hex(self._password_hash)
+
+    @property
+    def created(self) -> str:
+        return _unpack_stamp(self._created)
+
+    @property
+    def salt(self) -> str:
+        return _unpack_hex(self._salt)
+
+    def __getitem__(self, key):
+        if key in self._KEYSET:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self.KEYS)
+
+    def __len__(self) -> int:
+        return len(self.KEYS)
+
+    def __reduce__(self):
+        return Entry, tuple(getattr(self, key) for key in self.KEYS)
+
+    def __repr__(self) -> str:
+        return f"Entry({self.to_dict()!r})"
+
+    def to_dict(self) -> dict:
+        """Plain dict copy, for JSON and callers that need a mutable entry."""
+        return {key: getattr(self, key) for key in self.KEYS}
+
+
+def _created_key(entry: Entry) -> int:
+    return entry._created if type(entry._created) is int else _NO_STAMP
+
+
+def _assign_ids(entries: list[Entry], next_id: int = 1) -> int:
+    """Give entries without an id (or repeating one) fresh ids. Returns the next free id."""
+    seen, missing = set(), []
+    for e in entries:
+        if e.id is None or e.id in seen:
+            missing.append(e)
+        else:
+            seen.add(e.id)
+            next_id = max(next_id, e.id + 1)
+    for e in missing:
+        e.id = next_id
+        next_id += 1
+    return next_id
+
+
+def _file_signature(path: str):
+    """Cheap change detector for a vault file: (inode, mtime_ns, size) or None.
+
+    The inode catches an atomic rename even when mtime and size happen to match.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+_BLANKS = ("",) * len(ENTRY_FIELDS)
+
+
+class _EntryReader:
+    """Expat handlers that turn <entry> elements into Entry records.
+
+    No element tree is built: fields go straight from the parser callbacks
+    into the record, so a tag costs one call rather than an Element plus
+    a pair of iterparse events. Text is collected by `text.append` itself,
+    which keeps the most frequent callback out of Python entirely.
+    Finished records collect in `entries`.
+    """
+    def __init__(self, meta: dict = None):
+        self.meta     = meta
+        self.entries  = []
+        self.text     = []
+        self.position = 0
+        self._root    = False
+        self._id      = None
+        self._fields  = None
+
+    def start(self, tag, attrib):
+        if not self._root:
+            self._root = True
+            if self.meta is not None:
+                self.meta.update(attrib)
+        elif tag == "entry":
+            self.position += 1
+            self._id = int(attrib.get("id") or self.position)
+            self._fields = {}
+        self.text.clear()
+
+    def end(self, tag):
+        if tag == "entry" and self._fields is not None:
+            fields, self._fields = self._fields, None
+            self.entries.append(Entry(self._id, *map(fields.get, ENTRY_FIELDS, _BLANKS)))
+        elif self._fields is not None:
+            text = self.text
+            self._fields[tag] = text[0] if len(text) == 1 else "".join(text)
+
+
+_COMPRESSED = {".gz": "gzip", ".xz": "lzma"}    # file extension → codec
+_LEVELS = {"gzip": 6, "lzma": 1}                # lzma's own default (6) writes ~8x slower
+
+
+def _compression_of(path: str, default: str = None):
+    """Codec to write `path` with: named by a .gz/.xz extension, else `default`."""
+    return _COMPRESSED.get(os.path.splitext(path)[1].lower(), default)
+
+
+@contextmanager
+def _open_xml(path: str):
+    """Open a vault XML file for binary reads, decompressing as a stream.
+
+    gzip and xz files are recognised by their magic bytes, not their name,
+    so a vault stays readable after COMPRESSION changes. A damaged
+    compressed stream raises VaultCorruptError.
+    """
+    with open(path, "rb") as raw:
+        magic = raw.peek(6)[:6]
+        if magic.startswith(b"\x1f\x8b"):
+            import gzip    # deferred, like sqlite3: only compressed vaults pay for it
+            errors = (EOFError, OSError, zlib.error)
+            stream = gzip.GzipFile(fileobj=raw)
+        elif magic == b"\xfd7zXZ\x00":
+            import lzma
+            errors = (EOFError, lzma.LZMAError)
+            stream = lzma.LZMAFile(raw)
+        else:
+            yield raw
+            return
+        try:
+            with stream:
+                yield stream
+        except errors as exc:
+            raise VaultCorruptError(f"{path}: {exc}") from exc
+
+
+def _compressor(raw, codec: str):
+    """Binary writer that compresses into the open file `raw` and leaves it open."""
+    level = _LEVELS.get(codec) if COMPRESSION_LEVEL is None else COMPRESSION_LEVEL
+    if codec == "gzip":
+        import gzip
+        return gzip.GzipFile(filename="", mode="wb", fileobj=raw, compresslevel=level)
+    if codec == "lzma":
+        import lzma
+        return lzma.LZMAFile(raw, "wb", preset=level)
+    raise ValueError(f"unknown compression {codec!r}; use 'gzip' or 'lzma'")
+
+
+def _iter_xml(path: str, meta: dict = None):
+    """Yield Entry records from a vault XML file without building the tree.
+
+    The file is fed to the parser 64 KiB at a time, decompressed on the
+    fly if it is gzip or xz, and the records of each chunk are yielded
+    before the next is read, so memory stays flat and a caller that stops
+    early never reads the rest of the file. Root
+    attributes (e.g. generation) are copied into `meta`.
+    Entries written before ids existed get their 1-based file position,
+    which every process derives identically until the next rewrite
+    persists it.
+    """
+    if not os.path.exists(path):
+        return
+    reader = _EntryReader(meta)
+    parser = expat.ParserCreate()
+    parser.buffer_text = True
+    parser.buffer_size = 1 << 16
+    parser.StartElementHandler = reader.start
+    parser.EndElementHandler = reader.end
+    parser.CharacterDataHandler = reader.text.append
+    try:
+        with _open_xml(path) as f:
+            for chunk in iter(lambda: f.read(1 << 16), b""):
+                parser.Parse(chunk, False)
+                entries, reader.entries = reader.entries, []
+                yield from entries
+            parser.Parse(b"", True)
+            yield from reader.entries
+    except expat.ExpatError as exc:
+        raise VaultCorruptError(f"{path}: {exc}") from exc
+
+
+def _read_xml(path: str):
+    """Parse a vault XML file. Returns (generation, next_id, list of Entry).
+
+    A missing file is an empty vault; an unreadable one raises
+    VaultCorruptError rather than passing for empty, so the next save
+    cannot silently overwrite it.
+    """
+    meta = {}
+    entries = list(_iter_xml(path, meta))
+    return int(meta.get("generation", "0")), int(meta.get("next_id", "1")), entries
+
+
+def _fsync_dir(path: str):
+    """Persist a rename/create in the directory holding `path` (POSIX only)."""
+    if os.name != "posix":
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+# Characters XML 1.0 cannot carry at all, not even escaped
+_XML_INVALID = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]")
+
+
+def check_text(field: str, text: str) -> str:
+    """`text`, or ValueError if it holds a character the XML vault cannot store."""
+    bad = _XML_INVALID.search(text)
+    if bad:
+        raise ValueError(f"{field} contains {bad.group()!r}, which the vault cannot store")
+    return text
+
+
+def _escape(text: str) -> str:
+    # Inline instead of xml.sax.saxutils, which drags in urllib/http at import
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def _write_xml(path: str, entries, generation: int = 0, pretty: bool = None,
+               next_id: int = None, compression: str = None):
+    """Stream entries to an XML file, one <entry> at a time.
+
+    Nothing but the current entry is held in memory, so memory stays flat
+    however large the vault is. `pretty` defaults to PRETTY_XML; compact
+    mode drops the indentation and newlines. `next_id` is recorded on the
+    root so ids of deleted entries are not handed out again after a reload.
+    `compression` ("gzip" or "lzma") compresses the document as it is written.
+
+    The document is written to `<path>.tmp`, fsynced and renamed over
+    `path`, so a crash leaves either the old file or the new one, never a
+    truncated mix.
+    """
+    if pretty is None:
+        pretty = PRETTY_XML
+    nl, ind1, ind2 = ("\n", "  ", "    ") if pretty else ("", "", "")
+    next_attr = f' next_id="{next_id}"' if next_id is not None else ""
+    tmp = path + ".tmp"
+    try:
+        with open(tmp, "wb") as raw:
+            packed = _compressor(raw, compression) if compression else raw
+            f = io.TextIOWrapper(packed, encoding="utf-8")
+            f.write('<?xml version="1.0" ?>\n')
+            f.write(f'<vault version="1.0" updated="{datetime.now().isoformat()}" '
+                    f'generation="{generation}"{next_attr}>{nl}')
+            for e in entries:
+                entry_id = e.get("id")
+                parts = [f'{ind1}<entry id="{entry_id}">{nl}' if entry_id is not None
+                         else f"{ind1}<entry>{nl}"]
+                for key, val in e.items():
+                    if key == "id":
+                        continue
+                    parts.append(f"{ind2}<{key}>{_escape(str(val))}</{key}>{nl}")
+                parts.append(f"{ind1}</entry>{nl}")
+                chunk = "".join(parts)
+                if _XML_INVALID.search(chunk):
+                    # Would leave a file no parser accepts; keep the old one
+                    check_text(f"entry {entry_id}", chunk)
+                f.write(chunk)
+            f.write("</vault>\n")
+            f.flush()
+            f.detach()
+            if packed is not raw:
+                packed.close()    # ends the compressed stream; raw stays open
+            raw.flush()
+            if FSYNC:
+                os.fsync(raw.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    if FSYNC:
+        _fsync_dir(path)
+
+
+# ─── IN-MEMORY INDEX ──────────────────────────────────────────────────────────
+_WORD = re.compile(r"\w+")
+_TOP = "\U0010ffff"    # sorts after any real text: word + _TOP bounds a prefix range
+
+
+def _words(text: str) -> list[str]:
+    """Case-folded word tokens of `text`, as the search index keys them."""
+    return _WORD.findall(text.casefold())
+
+
+# Sort keys for VaultIndex.query / query_entries(order_by=…); ties go by id
+_ORDER_KEYS = {
+    "created":  _created_key,
+    "username": lambda e: e.username.casefold(),
+    "label":    lambda e: e.label.casefold(),
+}
+
+
+def _matches_words(entry: Entry, words) -> bool:
+    """True if every query word starts a word of the username or label."""
+    keys = _words(entry.username) + _words(entry.label)
+    return all(any(k.startswith(w) for k in keys) for w in words)
+
+
+class VaultIndex:
+    """Resident hash index over the vault entries.
+
+    Filled once from disk by the storage backend and kept in step with
+    every add/delete, so lookups are dict hits instead of file scans.
+    Entries are Entry records, also keyed by id, with an id → list position map that a
+    delete only invalidates from the deleted position onwards.
+
+    For search there is a label → entries inverted index and, built on
+    first use, sorted (word, id) and (sort key, id) lists, so a prefix or
+    date range is two bisects and a page in sort order a slice, rather
+    than a scan or a full sort.
+    """
+    def __init__(self):
+        self.entries  = []
+        self.by_id    = {}    # id → entry
+        self.by_user  = {}    # username_hash → [entry, ...] in file order
+        self.by_label = {}    # casefolded label → [entry, ...] in file order
+        self.next_id  = 1
+        self._pos     = {}    # id → list position; exact below _stale_from
+        self._stale_from = 0
+        self._words   = None  # sorted (word, id) over usernames and labels
+        self._orders  = {}    # _ORDER_KEYS field → sorted (key, id)
+
+    def rebuild(self, entries: list[Entry], next_id: int = 1):
+        self.entries  = [Entry.of(e) for e in entries]
+        self.next_id  = _assign_ids(self.entries, next_id)
+        self.by_id    = {}
+        self.by_user  = {}
+        self.by_label = {}
+        self._pos     = {}
+        self._words   = None
+        self._orders  = {}
+        for i, e in enumerate(self.entries):
+            self._pos[e.id] = i
+            self._link(e)
+        self._stale_from = len(self.entries)
+
+    def new_id(self) -> int:
+        entry_id, self.next_id = self.next_id, self.next_id + 1
+        return entry_id
+
+    def add(self, entry: Entry):
+        if self._stale_from == len(self.entries):
+            self._stale_from += 1
+        self._pos[entry.id] = len(self.entries)
+        self.next_id = max(self.next_id, entry.id + 1)
+        self.entries.append(entry)
+        self._link(entry)
+
+    def position(self, entry_id: int):
+        """List position of the entry with `entry_id`, or None."""
+        p = self._pos.get(entry_id)
+        if p is not None and p >= self._stale_from:
+            for i in range(self._stale_from, len(self.entries)):
+                self._pos[self.entries[i].id] = i
+            self._stale_from = len(self.entries)
+            p = self._pos[entry_id]
+        return p
+
+    def remove_many(self, ids) -> list[tuple[int, Entry]]:
+        """Drop the entries with `ids`, in one O(N) pass for many.
+
+        Returns (position, entry) pairs, highest position first.
+        """
+        hits = sorted(((self.position(i), i) for i in set(ids) if i in self.by_id),
+                      reverse=True)
+        if len(hits) == 1:
+            self.entries.pop(hits[0][0])
+        elif hits:
+            drop = {p for p, _ in hits}
+            self.entries = [e for i, e in enumerate(self.entries) if i not in drop]
+        removed = []
+        for p, entry_id in hits:
+            entry = self.by_id.pop(entry_id)
+            del self._pos[entry_id]
+            self._unlink(self.by_user, entry._username_hash, entry)
+            self._unlink(self.by_label, entry.label.casefold(), entry)
+            self._unsort(entry)
+            removed.append((p, entry))
+        if hits:
+            self._stale_from = min(self._stale_from, hits[-1][0])
+        return removed
+
+    def replace_many(self, entries) -> list[tuple[int, Entry]]:
+        """Swap in new versions of stored entries, matched by id.
+
+        Returns (position, entry) pairs for the ones that were present.
+        """
+        replaced = []
+        for entry in map(Entry.of, entries):
+            old = self.by_id.get(entry.id)
+            if old is None:
+                continue
+            p = self.position(entry.id)
+            self.entries[p] = entry
+            self.by_id[entry.id] = entry
+            self._swap(self.by_user, old._username_hash, entry._username_hash, old, entry)
+            self._swap(self.by_label, old.label.casefold(), entry.label.casefold(), old, entry)
+            if (old.username, old.label, old._created) != \
+                    (entry.username, entry.label, entry._created):
+                self._unsort(old)
+                self._sort_in(entry)
+            replaced.append((p, entry))
+        return replaced
+
+    def candidates(self, u_hash: str) -> list[Entry]:
+        """Entries stored under a username hash, in file order."""
+        return list(self.by_user.get(_pack_hex(u_hash), ()))
+
+    def search(self, text: str = "", label: str = None,
+               since: str = None, until: str = None) -> list[Entry]:
+        """Entries matching a filter, in file order.
+
+        Every word of `text` must start a word of the username or label;
+        `label` matches a whole label, ignoring case; `since`/`until` bound
+        `created` inclusively by prefix, so until="2024-03" takes in all of
+        March. The narrowest condition (a bisected word or date range, or
+        the label bucket) picks the candidates; the rest are checked on
+        those entries only.
+        """
+        if self._words is None:
+            self._words = sorted(k for e in self.entries for k in self._word_keys(e))
+        words = set(_words(text))
+        low, high = dates = _stamp_range(since, until)
+        spans = [(self._span(self._words, w, w + _TOP), w) for w in words]
+        if since or until:
+            spans.append((self._span(self._order("created"), low, high), None))
+        if not spans and label is None:
+            return list(self.entries)
+        folded = label.casefold() if label is not None else None
+        bucket = self.by_label.get(folded, []) if label is not None else None
+        best = min(spans, key=lambda s: s[0][2] - s[0][1], default=None)
+        if best is None or (bucket is not None and len(bucket) <= best[0][2] - best[0][1]):
+            # The label bucket is already in file order
+            if not spans:
+                return list(bucket)
+            return [e for e in bucket if self._accepts(e, words, None, low, high)]
+        (keys, i, j), word = best
+        # An entry appears once per matching word, hence the set
+        ids = set(map(operator.itemgetter(1), keys[i:j]))
+        words.discard(word)
+        if word is None:
+            low, high = dates = _stamp_range()
+        if words or dates != _stamp_range() or bucket is not None:
+            ids = {k for k in ids if self._accepts(self.by_id[k], words, folded, low, high)}
+        # Few hits: order them by position; many: one pass over the list
+        if len(ids) * 8 < len(self.entries):
+            return [self.by_id[k] for k in sorted(ids, key=self.position)]
+        return [e for e in self.entries if e.id in ids]
+
+    def query(self, order_by: str = "created", descending: bool = False,
+              limit: int = None, offset: int = 0, after: Entry = None) -> list[Entry]:
+        """One page of entries in `order_by` order, ties broken by id.
+
+        `after` is the last entry of the previous page (keyset pagination):
+        the page starts right behind it, even if it has since been deleted
+        or rows were added before it. `offset` then skips further rows.
+        Costs a bisect plus O(page).
+        """
+        keys = self._order(order_by)
+        start = 0
+        if after is not None:
+            mark = (_ORDER_KEYS[order_by](Entry.of(after)), after["id"])
+            start = (len(keys) - bisect.bisect_left(keys, mark) if descending
+                     else bisect.bisect_right(keys, mark))
+        start = min(start + max(offset, 0), len(keys))
+        stop = len(keys) if limit is None else min(start + max(limit, 0), len(keys))
+        if descending:
+            start, stop = len(keys) - stop, len(keys) - start
+            page = reversed(keys[start:stop])
+        else:
+            page = keys[start:stop]
+        return [self.by_id[k[1]] for k in page]
+
+    def _order(self, field: str) -> list:
+        keys = self._orders.get(field)
+        if keys is None:
+            key = _ORDER_KEYS[field]
+            keys = self._orders[field] = sorted((key(e), e.id) for e in self.entries)
+        return keys
+
+    @staticmethod
+    def _accepts(entry: Entry, words, folded_label, low: int, high: int) -> bool:
+        return ((folded_label is None or entry.label.casefold() == folded_label)
+                and low <= _created_key(entry) < high and _matches_words(entry, words))
+
+    def _link(self, entry: Entry):
+        self.by_id[entry.id] = entry
+        self.by_user.setdefault(entry._username_hash, []).append(entry)
+        self.by_label.setdefault(entry.label.casefold(), []).append(entry)
+        self._sort_in(entry)
+
+    @staticmethod
+    def _unlink(table: dict, key, entry: Entry):
+        bucket = table.get(key, [])
+        for i, e in enumerate(bucket):
+            if e is entry:
+                del bucket[i]
+                break
+        if not bucket:
+            table.pop(key, None)
+
+    def _swap(self, table: dict, old_key, new_key, old: Entry, new: Entry):
+        """Put `new` (already at old's list position) in old's place in `table`."""
+        if old_key == new_key:
+            bucket = table[old_key]
+            bucket[next(i for i, e in enumerate(bucket) if e is old)] = new
+            return
+        self._unlink(table, old_key, old)
+        bucket = table.setdefault(new_key, [])
+        # Buckets are in file order: bisect on list positions
+        p, lo, hi = self.position(new.id), 0, len(bucket)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.position(bucket[mid].id) < p:
+                lo = mid + 1
+            else:
+                hi = mid
+        bucket.insert(lo, new)
+
+    @staticmethod
+    def _word_keys(entry: Entry) -> set:
+        return {(w, entry.id) for w in _words(entry.username) + _words(entry.label)}
+
+    @staticmethod
+    def _span(keys: list, low: str, high: str) -> tuple:
+        """(keys, i, j) such that keys[i:j] are the (key, id) pairs with low <= key < high."""
+        return keys, bisect.bisect_left(keys, (low,)), bisect.bisect_left(keys, (high,))
+
+    def _sort_in(self, entry: Entry):
+        if self._words is not None:
+            for key in self._word_keys(entry):
+                bisect.insort(self._words, key)
+        for field, keys in self._orders.items():
+            bisect.insort(keys, (_ORDER_KEYS[field](entry), entry.id))
+
+    def _unsort(self, entry: Entry):
+        if self._words is not None:
+            for key in self._word_keys(entry):
+                self._discard(self._words, key)
+        for field, keys in self._orders.items():
+            self._discard(keys, (_ORDER_KEYS[field](entry), entry.id))
+
+    @staticmethod
+    def _discard(keys: list, key):
+        i = bisect.bisect_left(keys, key)
+        if i < len(keys) and keys[i] == key:
+            del keys[i]
+
+
+# ─── NEGATIVE-LOOKUP FILTER ───────────────────────────────────────────────────
+_MASK64 = (1 << 64) - 1
+
+
+def _user_key(entry_or_hash) -> bytes:
+    """16-byte key of a username hash (hex text, packed bytes or an Entry).
+
+    The MD5 digest itself, which is already uniformly distributed; a hash
+    that does not pack to 16 bytes (say an imported one in upper case) is
+    hashed first, so it gets a key that no lookup computes.
+    """
+    value = getattr(entry_or_hash, "_username_hash", entry_or_hash)
+    if type(value) is str:
+        value = _pack_hex(value)
+    if type(value) is not bytes or len(value) != 16:
+        value = hashlib.md5(value if type(value) is bytes else value.encode("utf-8")).digest()
+    return value
+
+
+def _bloom_key(entry_or_hash) -> int:
+    return int.from_bytes(_user_key(entry_or_hash), "little")
+
+
+class _BloomFilter:
+    """Persisted Bloom filter over username hashes at `<path>.bloom`.
+
+    Lets a process without a fresh resident index answer "no such user"
+    with a few byte reads instead of parsing the vault. The header stamps
+    the snapshot signature and the journal (inode, bytes) it covers; a
+    reader trusts the filter only while the stamp matches and also scans
+    the journal past the covered bytes, so a writer that skipped the
+    filter (a crash, an older VAULT) costs speed, never a missed entry.
+    Writers set bits in place before they write the entries and restamp
+    after; snapshots rebuild the filter, which drops deleted usernames.
+    Positions come from double hashing the 128-bit key.
+    """
+    MAGIC   = b"VBLM"
+    VERSION = 1
+    # magic, version, hashes, bits, capacity, keys added, snapshot ino/mtime_ns/size,
+    # journal ino, journal bytes covered
+    _HEAD   = struct.Struct("<4sHHQQQQqqQQ")
+    MIN_CAPACITY = 1024
+
+    def __init__(self, path: str):
+        self.path  = path + ".bloom"
+        self.stats = {"checks": 0, "rejected": 0, "passed": 0,
+                      "false_positives": 0, "unavailable": 0}
+
+    @staticmethod
+    def shape(capacity: int) -> tuple[int, int]:
+        """(bits, hashes) for `capacity` keys at BLOOM_FP_RATE."""
+        bits = math.ceil(-capacity * math.log(BLOOM_FP_RATE) / math.log(2) ** 2)
+        bits += -bits % 8
+        return bits, max(1, round(bits / capacity * math.log(2)))
+
+    def header(self):
+        """The parsed header as a dict, or None if there is no valid filter file."""
+        try:
+            with open(self.path, "rb") as f:
+                return self._parse(f.read(self._HEAD.size))
+        except OSError:
+            return None
+
+    @classmethod
+    def _parse(cls, raw: bytes):
+        if len(raw) < cls._HEAD.size:
+            return None
+        (magic, version, hashes, bits, capacity, count, ino, mtime, size,
+         journal_ino, covered) = cls._HEAD.unpack(raw)
+        if magic != cls.MAGIC or version != cls.VERSION:
+            return None
+        return {"hashes": hashes, "bits": bits, "capacity": capacity, "count": count,
+                "snapshot": (ino, mtime, size), "journal_ino": journal_ino, "covered": covered}
+
+    def _pack_header(self, head: dict) -> bytes:
+        return self._HEAD.pack(self.MAGIC, self.VERSION, head["hashes"], head["bits"],
+                               head["capacity"], head["count"], *head["snapshot"],
+                               head["journal_ino"], head["covered"])
+
+    @staticmethod
+    def _stamp_of(snapshot, journal) -> tuple:
+        """(snapshot signature, journal inode, journal bytes) as kept in the header."""
+        return (snapshot or (0, 0, 0),) + ((journal[0], journal[2]) if journal else (0, 0))
+
+    def _stamp(self, head: dict, snapshot, journal):
+        head["snapshot"], head["journal_ino"], head["covered"] = self._stamp_of(snapshot, journal)
+
+    def build(self, entries, count: int, snapshot, journal):
+        """Write a fresh filter over `entries` (count of them given), sized with room to grow."""
+        capacity = max(self.MIN_CAPACITY, 2 * count)
+        bits, hashes = self.shape(capacity)
+        table = bytearray(bits // 8)
+        for e in entries:
+            key = _bloom_key(e)
+            h1, h2 = key & _MASK64, (key >> 64) | 1
+            for i in range(hashes):
+                p = (h1 + i * h2) % bits
+                table[p >> 3] |= 1 << (p & 7)
+        head = {"hashes": hashes, "bits": bits, "capacity": capacity, "count": count}
+        self._stamp(head, snapshot, journal)
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(self._pack_header(head))
+            f.write(table)
+            if FSYNC:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def insert(self, entries: list[Entry], snapshot, journal) -> bool:
+        """Set the bits of `entries` in place, durably before the entries are written.
+
+        For writers holding the file lock. Returns False, changing nothing,
+        if the filter is missing, full or not stamped for these files:
+        journal bytes it does not cover may hold usernames it lacks, so
+        the caller must rebuild it instead.
+        """
+        try:
+            with open(self.path, "r+b") as f, mmap.mmap(f.fileno(), 0) as table:
+                return self._insert(table, entries, self._stamp_of(snapshot, journal))
+        except (OSError, ValueError):    # missing or empty file
+            return False
+
+    def _insert(self, table, entries: list[Entry], stamp: tuple) -> bool:
+        head = self._parse(table[:self._HEAD.size])
+        if (head is None or (head["snapshot"], head["journal_ino"], head["covered"]) != stamp
+                or head["count"] + len(entries) > head["capacity"]
+                or (head["bits"], head["hashes"]) != self.shape(head["capacity"])):
+            return False
+        if entries:
+            bits, hashes, base = head["bits"], head["hashes"], self._HEAD.size
+            for e in entries:
+                key = _bloom_key(e)
+                h1, h2 = key & _MASK64, (key >> 64) | 1
+                for i in range(hashes):
+                    p = (h1 + i * h2) % bits
+                    table[base + (p >> 3)] |= 1 << (p & 7)
+            head["count"] += len(entries)
+            table[:base] = self._pack_header(head)
+            if FSYNC:
+                table.flush()
+        return True
+
+    def restamp(self, snapshot, journal):
+        """Record that the filter now covers the files with these signatures."""
+        head = self.header()
+        if head is None:
+            return
+        self._stamp(head, snapshot, journal)
+        with open(self.path, "r+b") as f:
+            f.write(self._pack_header(head))
+
+    def excludes(self, u_hash: str, snapshot, journal, journal_path: str = None):
+        """True only if no entry under `u_hash` can be in the vault.
+
+        False means "maybe"; None that no filter matches the files on disk.
+        """
+        self.stats["checks"] += 1
+        try:
+            with open(self.path, "rb") as f:
+                head = self._parse(f.read(self._HEAD.size))
+                if head is None or head["snapshot"] != self._stamp_of(snapshot, None)[0] or (head["covered"] and (
+                        journal is None or journal[0] != head["journal_ino"]
+                        or journal[2] < head["covered"])):
+                    self.stats["unavailable"] += 1
+                    return None
+                key = _bloom_key(u_hash)
+                h1, h2 = key & _MASK64, (key >> 64) | 1
+                present = True
+                for i in range(head["hashes"]):
+                    p = (h1 + i * h2) % head["bits"]
+                    f.seek(self._HEAD.size + (p >> 3))
+                    if not f.read(1)[0] & (1 << (p & 7)):
+                        present = False
+                        break
+            if not present and journal is not None and journal[2] > head["covered"]:
+                # Records no writer has added to the filter yet
+                with open(journal_path, "rb") as j:
+                    j.seek(head["covered"])
+                    present = u_hash.encode("ascii", "replace") in j.read()
+        except OSError:    # missing, or replaced or compacted meanwhile
+            self.stats["unavailable"] += 1
+            return None
+        self.stats["passed" if present else "rejected"] += 1
+        return not present
+
+
+# ─── BINARY SNAPSHOT ──────────────────────────────────────────────────────────
+class _BinarySnapshot:
+    """Memory-mapped binary mirror of the XML snapshot at `<path>.snap`.
+
+    After the header comes a table of fixed-width (username key, offset,
+    length) rows sorted by username hash, then a heap holding every entry
+    in file order as its id and fields, NUL-separated and ended by 0x1E.
+    Neither byte is legal XML text, so _write_xml() has already refused
+    any entry holding one; write() still declines to mirror such entries
+    and a reader that meets a malformed record falls back to the XML.
+    A lookup maps the file and bisects
+    the table, so only a handful of pages are touched, and those pages sit
+    in the page cache shared by every process reading the vault. A cold
+    load splits the heap instead of parsing XML.
+
+    The header stamps the signature of the XML file it mirrors and is
+    trusted only while that matches, so a snapshot written by anything
+    else simply sends readers back to the XML. It carries a CRC32 of
+    itself and one of the body; full loads check both, lookups only the
+    header's, to stay O(log N).
+    """
+    MAGIC   = b"VSNP"
+    VERSION = 1
+    # magic, version, rows, XML ino/mtime_ns/size, generation, next_id,
+    # heap bytes, body CRC32, header CRC32 (of the header with this field 0)
+    _HEAD   = struct.Struct("<4sHQQqqQQQII")
+    _ROW    = struct.Struct("<16sQI")
+    _FIELDS = operator.attrgetter(*ENTRY_FIELDS)
+    CHUNK   = 1 << 22    # heap bytes decoded at a time by load()
+
+    def __init__(self, path: str):
+        self.path = path + ".snap"
+
+    def write(self, entries, generation: int, next_id: int, snapshot):
+        """Mirror `entries` (in file order) for the XML file with signature `snapshot`."""
+        rows, heap, offset = [], [], 0
+        for e in entries:
+            blob = "\0".join((str(e.id),) + self._FIELDS(e)).encode("utf-8")
+            if blob.count(b"\0") != len(ENTRY_FIELDS) or b"\x1e" in blob:
+                try:    # drop the mirror of the previous XML; readers use the XML
+                    os.remove(self.path)
+                except FileNotFoundError:
+                    pass
+                return
+            rows.append((_user_key(e), offset, len(blob)))
+            heap.append(blob)
+            offset += len(blob) + 1
+        rows.sort(key=operator.itemgetter(0))    # stable: file order within a username
+        table = b"".join(itertools.starmap(self._ROW.pack, rows))
+        heap = b"\x1e".join(heap) + b"\x1e" if heap else b""
+        ino, mtime, size = snapshot or (0, 0, 0)
+        head = [self.MAGIC, self.VERSION, len(rows), ino, mtime, size, generation, next_id,
+                len(heap), zlib.crc32(heap, zlib.crc32(table)), 0]
+        head[-1] = zlib.crc32(self._HEAD.pack(*head))
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(self._HEAD.pack(*head))
+            f.write(table)
+            f.write(heap)
+            if FSYNC:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def _open(self, snapshot):
+        """(mapping, header dict) if the file mirrors the XML with `snapshot`, else None."""
+        try:
+            with open(self.path, "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):    # missing or empty
+            return None
+        raw = mapped[:self._HEAD.size]
+        if len(raw) == self._HEAD.size:
+            fields = list(self._HEAD.unpack(raw))
+            crc, fields[-1] = fields[-1], 0
+            if (fields[0] == self.MAGIC and fields[1] == self.VERSION
+                    and zlib.crc32(self._HEAD.pack(*fields)) == crc
+                    and tuple(fields[3:6]) == (snapshot or (0, 0, 0))):
+                rows, heap = fields[2], fields[8]
+                table = self._HEAD.size
+                if len(mapped) == table + rows * self._ROW.size + heap:
+                    return mapped, {"rows": rows, "generation": fields[6], "next_id": fields[7],
+                                    "table": table, "heap": table + rows * self._ROW.size,
+                                    "heap_size": heap, "crc": fields[9]}
+        mapped.close()
+        return None
+
+    @staticmethod
+    def _entry(fields):
+        """The Entry a heap record split into `fields` describes, or None if malformed."""
+        if len(fields) != len(ENTRY_FIELDS) + 1 or not fields[0].isdigit():
+            return None
+        return Entry(int(fields[0]), *fields[1:])
+
+    def lookup(self, u_hash: str, snapshot):
+        """(generation, entries under `u_hash` in file order), or None if unusable."""
+        opened = self._open(snapshot)
+        if opened is None:
+            return None
+        mapped, head = opened
+        with mapped:
+            key, row, table = _user_key(u_hash), self._ROW.size, head["table"]
+            lo, hi = 0, head["rows"]
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if mapped[table + mid * row:table + mid * row + 16] < key:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            entries = []
+            for i in range(lo, head["rows"]):
+                row_key, offset, length = self._ROW.unpack_from(mapped, table + i * row)
+                if row_key != key:
+                    break
+                start = head["heap"] + offset
+                try:
+                    entry = self._entry(mapped[start:start + length].decode("utf-8").split("\0"))
+                except UnicodeDecodeError:
+                    return None
+                if entry is None:
+                    return None
+                entries.append(entry)
+        return head["generation"], entries
+
+    def load(self, snapshot):
+        """(generation, next_id, all entries in file order), or None if unusable or corrupt."""
+        opened = self._open(snapshot)
+        if opened is None:
+            return None
+        mapped, head = opened
+        with mapped:
+            crc, end = 0, head["heap"] + head["heap_size"]
+            for pos in range(head["table"], end, self.CHUNK):
+                crc = zlib.crc32(mapped[pos:min(pos + self.CHUNK, end)], crc)
+            if crc != head["crc"]:
+                return None
+            entries, pos = [], head["heap"]
+            while pos < end:
+                cut = mapped.rfind(b"\x1e", pos, min(pos + self.CHUNK, end)) + 1
+                if cut <= pos:    # one entry longer than CHUNK
+                    cut = mapped.find(b"\x1e", pos, end) + 1
+                    if cut <= pos:
+                        return None
+                try:
+                    blobs = mapped[pos:cut - 1].decode("utf-8").split("\x1e")
+                except UnicodeDecodeError:
+                    return None
+                for blob in blobs:
+                    entry = self._entry(blob.split("\0"))
+                    if entry is None:
+                        return None
+                    entries.append(entry)
+                pos = cut
+        return head["generation"], head["next_id"], entries
+
+
+# ─── CHANGE EVENTS ────────────────────────────────────────────────────────────
+_listeners = []
+
+
+def subscribe(callback):
+    """Register callback(kind, index, entry) to hear about vault changes.
+
+    kind is "insert", "update" or "delete" with the entry's list position, or "reset"
+    (index/entry None) when the contents were replaced wholesale or changed
+    on disk behind our back. Callbacks run on the thread that made the change.
+    """
+    _listeners.append(callback)
+
+
+def unsubscribe(callback):
+    if callback in _listeners:
+        _listeners.remove(callback)
+
+
+def _notify(kind: str, index: int = None, entry: dict = None):
+    for callback in list(_listeners):
+        callback(kind, index, entry)
+
+
+# ─── INTER-PROCESS LOCKING ────────────────────────────────────────────────────
+class _FileLock:
+    """Advisory exclusive lock on `<path>.lock`, shared by every process.
+
+    Writers hold it around each read-modify-write so concurrent processes
+    cannot lose each other's updates; `writer` makes the threads of one
+    process take turns too. Readers take neither: snapshots are replaced
+    by atomic rename and journal readers skip a torn last line. They only
+    take `mutex`, which guards the in-memory index and which a writer
+    holds just while applying a change already on disk, so a write's I/O
+    or compaction never holds up a lookup. Re-entrant within a process,
+    so a compaction nested inside an add does not deadlock.
+    """
+    def __init__(self, path: str, mutex=None):
+        self.path   = path + ".lock"
+        self.mutex  = mutex or threading.RLock()
+        self.writer = threading.RLock()
+        self._owner = None    # ident of the thread writing, if any
+        self._depth = 0
+        self._fd    = None
+
+    def busy(self) -> bool:
+        """True while another thread of this process is writing."""
+        owner = self._owner
+        return owner is not None and owner != threading.get_ident()
+
+    def __enter__(self):
+        self.writer.acquire()
+        if self._depth == 0:
+            fd = None
+            try:
+                fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+                if fcntl:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                else:
+                    while True:
+                        try:
+                            msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                            break
+                        except OSError:    # LK_LOCK gives up after ~10 s
+                            continue
+            except BaseException:    # leave neither the lock nor a descriptor behind
+                if fd is not None:
+                    os.close(fd)
+                self.writer.release()
+                raise
+            self._fd, self._owner = fd, threading.get_ident()
+        self._depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._depth -= 1
+        if self._depth == 0:
+            self._owner = None
+            if fcntl:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+            os.close(self._fd)
+            self._fd = None
+        self.writer.release()
+        return False
+
+
+def _read_header(path: str) -> dict:
+    """Numeric <vault> attributes (generation, next_id) from a file's first few hundred bytes."""
+    try:
+        with _open_xml(path) as f:
+            head = f.read(512)
+    except (OSError, VaultCorruptError):
+        return {}
+    root = re.search(rb"<vault\b[^>]*>", head)
+    if not root:
+        return {}
+    return {k.decode(): int(v) for k, v in re.findall(rb'(\w+)="(\d+)"', root.group())}
+
+
+# ─── STORAGE BACKENDS ─────────────────────────────────────────────────────────
+class XMLStorage:
+    """Whole-file storage: every mutation rewrites the XML at `path`.
+
+    The resident index is tied to the file signature (inode, mtime, size),
+    so a change by another process makes it stale and the next access
+    re-reads the file. Mutations run under the inter-process file lock;
+    while one is in flight, other threads keep reading the index as it
+    was, and a compaction builds its new index aside and swaps it in.
+    """
+    _notify = staticmethod(_notify)    # change events; shards translate positions
+
+    def __init__(self, path: str):
+        self.path       = path
+        self.index      = VaultIndex()
+        self.lock       = _FileLock(path)
+        self.bloom      = _BloomFilter(path)
+        self.binary     = _BinarySnapshot(path)
+        self.generation = 0
+        self._next_id   = 1
+        self._sig       = None
+        self._loaded    = False
+
+    def signature(self):
+        return _file_signature(self.path)
+
+    def is_fresh(self) -> bool:
+        # Mid-write the files run ahead of the index; the writer catches it up
+        return self._loaded and (self.lock.busy() or self.signature() == self._sig)
+
+    def ensure_loaded(self) -> VaultIndex:
+        with self.lock.mutex:
+            if not self.is_fresh():
+                was_loaded = self._loaded
+                self._sig = self.signature()
+                entries = self._read()
+                self.index.rebuild(entries, self._next_id)
+                self._loaded = True
+                if was_loaded:
+                    self._notify("reset")
+            return self.index
+
+    def _read(self) -> list[Entry]:
+        mirrored = BINARY_SNAPSHOT and self.binary.load(_file_signature(self.path))
+        self.generation, self._next_id, entries = mirrored or _read_xml(self.path)
+        return entries
+
+    def _write_snapshot(self, entries, next_id: int):
+        """Write `entries` as the XML snapshot at self.generation, then its binary mirror."""
+        if BINARY_SNAPSHOT:
+            entries = list(entries)
+        _write_xml(self.path, entries, self.generation, next_id=next_id,
+                   compression=_compression_of(self.path, COMPRESSION))
+        if BINARY_SNAPSHOT:
+            self.binary.write(entries, self.generation, next_id, _file_signature(self.path))
+
+    def load(self) -> list[Entry]:
+        return list(self.ensure_loaded().entries)
+
+    def iter_entries(self):
+        if self.is_fresh():
+            yield from list(self.index.entries)
+        else:
+            yield from _iter_xml(self.path)
+
+    def save(self, entries: list[dict]):
+        with self.lock:
+            self._snapshot(entries)
+        self._notify("reset")
+
+    def _snapshot(self, entries: list[dict]):
+        # Another process may have moved the counters on since we last read
+        head = _read_header(self.path)
+        self.generation = max(self.generation, head.get("generation", 0)) + 1
+        # Built aside (this also hands out ids to entries lacking one), so
+        # lookups go on using the current index until the swap
+        index = copy.copy(self.index)
+        index.rebuild(entries, max(self.index.next_id, head.get("next_id", 1)))
+        self._write_snapshot(index.entries, index.next_id)
+        with self.lock.mutex:
+            self.index = index
+            self._sig = self.signature()
+            self._loaded = True
+        if BLOOM_FP_RATE:
+            self.bloom.build(index.entries, len(index.entries), *self._bloom_state())
+
+    def append(self, entry: dict):
+        self.extend([entry])
+
+    def extend(self, entries):
+        """Store several entries with a single write, giving each a fresh id."""
+        entries = [Entry.of(e) for e in entries]
+        with self.lock:
+            index = self.ensure_loaded()
+            for entry in entries:
+                entry.id = index.new_id()
+            self._bloom_add(index, entries)
+            self._write_added(index, entries)
+            with self.lock.mutex:
+                for entry in entries:
+                    index.add(entry)
+                self._sig = self.signature()
+                for i, entry in enumerate(entries, len(index.entries) - len(entries)):
+                    self._notify("insert", i, entry)
+            self._bloom_stamp()
+            self._maybe_compact()
+
+    def get(self, entry_id: int):
+        return self.ensure_loaded().by_id.get(entry_id)
+
+    def count(self) -> int:
+        with self.lock.mutex:
+            return len(self.ensure_loaded().entries)
+
+    def update_many(self, entries, expected: dict = None) -> int:
+        """Replace stored entries by id with a single write. Returns the count.
+
+        `expected` maps id → password_hash: an entry whose stored hash has
+        changed since the caller read it is left alone (compare-and-swap).
+        """
+        entries = [Entry.of(e) for e in entries]
+        with self.lock:
+            index = self.ensure_loaded()
+            entries = [e for e in entries if e.id in index.by_id and (
+                expected is None
+                or index.by_id[e.id].password_hash == expected[e.id])]
+            if not entries:
+                return 0
+            self._bloom_add(index, [e for e in entries
+                                    if e._username_hash != index.by_id[e.id]._username_hash])
+            self._write_updated(index, entries)
+            with self.lock.mutex:
+                replaced = index.replace_many(entries)
+                self._sig = self.signature()
+                for position, entry in replaced:
+                    self._notify("update", position, entry)
+            self._bloom_stamp()
+            self._maybe_compact()
+            return len(replaced)
+
+    def remove(self, entry_id: int):
+        removed = self.remove_many([entry_id])
+        return removed[0] if removed else None
+
+    def remove_many(self, ids) -> list[Entry]:
+        """Delete the entries with `ids` with a single write; unknown ids are skipped."""
+        with self.lock:
+            index = self.ensure_loaded()
+            ids = [i for i in dict.fromkeys(ids) if i in index.by_id]
+            if not ids:
+                return []
+            self._bloom_add(index, [])
+            self._write_removed(index, ids)
+            with self.lock.mutex:
+                removed = index.remove_many(ids)
+                self._sig = self.signature()
+                # Highest position first, so each index is still valid when applied
+                for position, entry in removed:
+                    self._notify("delete", position, entry)
+            self._bloom_stamp()
+            self._maybe_compact()
+            return [entry for _, entry in removed]
+
+    def _write_added(self, index: VaultIndex, entries: list[Entry]):
+        self.generation += 1
+        self._write_snapshot(itertools.chain(index.entries, entries), index.next_id)
+
+    def _write_removed(self, index: VaultIndex, ids: list[int]):
+        drop = set(ids)
+        self.generation += 1
+        self._write_snapshot((e for e in index.entries if e.id not in drop), index.next_id)
+
+    def _write_updated(self, index: VaultIndex, entries: list[Entry]):
+        new = {e.id: e for e in entries}
+        self.generation += 1
+        self._write_snapshot((new.get(e.id, e) for e in index.entries), index.next_id)
+
+    def _maybe_compact(self):
+        pass
+
+    def _bloom_state(self):
+        """(snapshot, journal) signatures the Bloom filter is stamped with."""
+        return _file_signature(self.path), None
+
+    def _bloom_tracks(self) -> bool:
+        """True if each write keeps the Bloom filter (and its stamp) up to date."""
+        return bool(BLOOM_FP_RATE)
+
+    def _bloom_add(self, index: VaultIndex, entries: list[Entry]):
+        """Before a write: add `entries` to the filter, or rebuild it from the
+        index if it is missing, full or does not cover the files on disk."""
+        if not self._bloom_tracks():
+            return
+        state = self._bloom_state()
+        if not self.bloom.insert(entries, *state):
+            self.bloom.build(itertools.chain(index.entries, entries),
+                             len(index.entries) + len(entries), *state)
+
+    def _bloom_stamp(self):
+        """After a write: mark the filter as covering the files as they are now."""
+        if self._bloom_tracks():
+            self.bloom.restamp(*self._bloom_state())
+
+    def flush(self):
+        pass    # every write is already synced before it returns
+
+    def candidates(self, u_hash: str):
+        """Yield the entries stored under a username hash.
+
+        Without a fresh resident index, the Bloom filter first turns away
+        usernames that are not in the vault, so a miss reads neither the
+        snapshot nor a changed file.
+        """
+        verdict = None
+        if BLOOM_FP_RATE and not self.is_fresh():
+            verdict = self.bloom.excludes(u_hash, *self._bloom_state(),
+                                          journal_path=self.path + ".journal")
+            if verdict:
+                return
+        found = False
+        if self._loaded:
+            matches = self.ensure_loaded().candidates(u_hash)
+        else:
+            matches = self._cold_candidates(u_hash)
+        for e in matches:
+            found = True
+            yield e
+        if verdict is False and not found:
+            self.bloom.stats["false_positives"] += 1
+
+    def _cold_candidates(self, u_hash: str):
+        """Candidates without the resident index: bisected from the binary
+        snapshot, else streamed from the XML, so a caller that stops at the
+        first match skips the full index build on a one-off check."""
+        if BINARY_SNAPSHOT:
+            mirrored = self.binary.lookup(u_hash, _file_signature(self.path))
+            if mirrored is not None:
+                matches = self._replay(u_hash, *mirrored)
+                if matches is not None:
+                    return matches
+        key = _pack_hex(u_hash)
+        return (e for e in self.iter_entries() if e._username_hash == key)
+
+    def _replay(self, u_hash: str, generation: int, entries: list[Entry]):
+        """Bring one username's snapshot entries up to date; the XML is always current."""
+        return entries
+
+    def search(self, text: str = "", label: str = None,
+               since: str = None, until: str = None) -> list[Entry]:
+        """Entries matching a filter (see VaultIndex.search), in file order."""
+        with self.lock.mutex:
+            return self.ensure_loaded().search(text, label, since, until)
+
+    def query(self, order_by: str = "created", descending: bool = False,
+              limit: int = None, offset: int = 0, after: Entry = None) -> list[Entry]:
+        """One page of entries in sort order (see VaultIndex.query)."""
+        with self.lock.mutex:
+            return self.ensure_loaded().query(order_by, descending, limit, offset, after)
+
+
+class JournalStorage(XMLStorage):
+    """XML snapshot plus an append-only JSON-lines journal of add/delete records.
+
+    Mutations append one line to `<path>.journal` ({"op": "add"|"set",
+    "entry": …} or {"op": "del", "id": …}), so a change costs O(1) I/O.
+    Once the journal holds JOURNAL_COMPACT_EVERY records it is folded back
+    into the snapshot. The journal's first line names the snapshot
+    generation it extends; a journal left behind by an interrupted
+    compaction is therefore recognised as already applied and discarded.
+
+    When another process only appended to the journal, the resident index
+    catches up by replaying the new tail instead of re-reading everything.
+    """
+    def __init__(self, path: str):
+        super().__init__(path)
+        self.journal_path = path + ".journal"
+        self._pending     = 0
+        self._journal_pos = 0        # bytes of journal already applied
+        self._stale       = False    # journal on disk belongs to an older snapshot
+        self._sync_lock   = threading.Lock()
+        self._sync_timer  = None
+
+    def signature(self):
+        return (_file_signature(self.path), _file_signature(self.journal_path))
+
+    def _read_journal(self, start: int = 0, only: bytes = None):
+        """Read journal records from byte `start`.
+
+        Returns (base, records, end): the snapshot generation named in the
+        header (only when reading from 0, else None), the records, and the
+        offset just past the last complete line. With `only`, add records
+        not containing those bytes are skipped unparsed.
+        """
+        base, records, end = None, [], start
+        try:
+            f = open(self.journal_path, "rb")
+        except FileNotFoundError:
+            return None, [], 0
+        with f:
+            f.seek(start)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break    # torn trailing record from an interrupted write
+                if only is not None and line.startswith(b'{"op": "add"') and only not in line:
+                    end += len(line)
+                    continue
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    break
+                if end == 0:
+                    base = rec.get("base")
+                else:
+                    if "entry" in rec:
+                        rec["entry"] = Entry.of(rec["entry"])
+                    records.append(rec)
+                end += len(line)
+        return base, records, end
+
+    def _read(self) -> list[Entry]:
+        for _ in range(5):
+            entries = super()._read()
+            base, records, end = self._read_journal()
+            # A base newer than our snapshot means a compaction replaced the
+            # snapshot while we were reading it: read again.
+            if base is None or base <= self.generation:
+                break
+        self._stale = base is not None and base != self.generation
+        if self._stale:
+            records = []
+        deleted, updated = set(), {}
+        for rec in records:
+            # Ids added and deleted within the journal are gone from the
+            # entries but must still never be handed out again
+            entry_id = rec["entry"].id if "entry" in rec else rec.get("id")
+            if entry_id is not None:
+                self._next_id = max(self._next_id, entry_id + 1)
+            if rec["op"] == "add":
+                entries.append(rec["entry"])
+            elif rec["op"] == "set":
+                updated[rec["entry"].id] = rec["entry"]
+            elif "id" in rec:
+                deleted.add(rec["id"])
+            elif 0 <= rec["index"] < len(entries):    # positional record, pre-ids
+                entries.pop(rec["index"])
+        if deleted or updated:
+            entries = [updated.get(e.id, e) for e in entries if e.id not in deleted]
+        self._pending = len(records)
+        self._journal_pos = end
+        return entries
+
+    def ensure_loaded(self) -> VaultIndex:
+        with self.lock.mutex:
+            if self._loaded and not self.is_fresh() and self._catch_up():
+                return self.index
+            return super().ensure_loaded()
+
+    def _replay(self, u_hash: str, generation: int, entries: list[Entry]):
+        """Apply the journal to one username's snapshot entries.
+
+        Only add records naming the username are parsed. Returns None when
+        the journal needs the full replay (positional deletes, adds
+        without ids).
+        """
+        base, records, _ = self._read_journal(only=u_hash.encode("ascii", "replace"))
+        if base != generation:
+            return entries    # no journal, or one left over from an older snapshot
+        key = _pack_hex(u_hash)
+        matches = {e.id: e for e in entries}
+        for rec in records:
+            if rec["op"] == "del":
+                if "id" not in rec:
+                    return None
+                matches.pop(rec["id"], None)
+            elif rec["entry"].id is None:
+                return None
+            elif rec["entry"]._username_hash == key:
+                matches[rec["entry"].id] = rec["entry"]
+            else:
+                matches.pop(rec["entry"].id, None)    # renamed away by a "set"
+        return list(matches.values())
+
+    def _catch_up(self) -> bool:
+        """Apply journal records appended by other processes since we last
+        looked. Returns False when the snapshot or journal was replaced and
+        a full reload is needed instead."""
+        snap_sig, journal_sig = sig = self.signature()
+        old_snap, old_journal = self._sig
+        if self._stale or snap_sig != old_snap or journal_sig is None:
+            return False
+        if old_journal is not None and (journal_sig[0] != old_journal[0]
+                                        or journal_sig[2] < self._journal_pos):
+            return False    # journal rotated or truncated
+        base, records, end = self._read_journal(self._journal_pos)
+        if self._journal_pos == 0 and base != self.generation:
+            return False
+        index = self.index
+        for rec in records:
+            if rec["op"] == "add":
+                entry = rec["entry"]
+                if entry.id is None:
+                    entry.id = index.new_id()
+                index.add(entry)
+                self._notify("insert", len(index.entries) - 1, entry)
+                continue
+            if rec["op"] == "set":
+                for position, entry in index.replace_many([rec["entry"]]):
+                    self._notify("update", position, entry)
+                continue
+            if "id" in rec:
+                entry_id = rec["id"]
+            elif 0 <= rec["index"] < len(index.entries):
+                entry_id = index.entries[rec["index"]].id
+            else:
+                continue
+            for position, entry in index.remove_many([entry_id]):
+                self._notify("delete", position, entry)
+        self._pending += len(records)
+        self._journal_pos = end
+        self._sig = sig
+        return True
+
+    def iter_entries(self):
+        if self.is_fresh():
+            yield from list(self.index.entries)
+            return
+        base, records, _ = self._read_journal()
+        if any(rec["op"] == "del" and "id" not in rec for rec in records):
+            # Positional deletes from an older journal need the full list.
+            yield from self.load()
+            return
+        meta = {}
+        snapshot = _iter_xml(self.path, meta)
+        first = next(snapshot, None)
+        if base != int(meta.get("generation", "0")):
+            records = []
+        deleted = {rec["id"] for rec in records if rec["op"] == "del"}
+        updated = {rec["entry"].id: rec["entry"] for rec in records if rec["op"] == "set"}
+        for e in itertools.chain([first] if first else [], snapshot):
+            if e.id not in deleted:
+                yield updated.get(e.id, e)
+        for rec in records:
+            if rec["op"] == "add" and rec["entry"].id not in deleted:
+                yield updated.get(rec["entry"].id, rec["entry"])
+
+    def _log(self, records: list[dict]):
+        """Append records; fsync now, or within GROUP_COMMIT_WINDOW.
+
+        Callers hold the file lock and have caught up with the journal.
+        """
+        group = FSYNC and GROUP_COMMIT_WINDOW > 0
+        with self._sync_lock:
+            if self._stale:
+                os.remove(self.journal_path)
+                self._stale, self._journal_pos = False, 0
+            fresh = not os.path.exists(self.journal_path)
+            with open(self.journal_path, "ab") as f:
+                if fresh:
+                    f.write(json.dumps({"base": self.generation}).encode("utf-8") + b"\n")
+                f.writelines(json.dumps(rec).encode("utf-8") + b"\n" for rec in records)
+                f.flush()
+                if FSYNC and not group:
+                    os.fsync(f.fileno())
+                self._journal_pos = f.tell()
+            if FSYNC and fresh:
+                _fsync_dir(self.journal_path)
+            if group and self._sync_timer is None:
+                self._sync_timer = threading.Timer(GROUP_COMMIT_WINDOW, self.flush)
+                self._sync_timer.daemon = True
+                self._sync_timer.start()
+        self._pending += len(records)
+
+    def flush(self):
+        """Group commit: one fsync for every record logged since the last one."""
+        with self._sync_lock:
+            timer, self._sync_timer = self._sync_timer, None
+            if timer is None:
+                return
+            timer.cancel()
+            try:
+                fd = os.open(self.journal_path, os.O_WRONLY | os.O_APPEND)
+            except FileNotFoundError:
+                return    # compacted meanwhile; the new snapshot is already synced
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def _snapshot(self, entries: list[dict]):
+        super()._snapshot(entries)
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        self._pending = 0
+        self._journal_pos = 0
+        self._stale = False
+        self._sig = self.signature()
+        if BLOOM_FP_RATE:
+            self.bloom.restamp(*self._bloom_state())    # built above, before the journal went
+
+    def _bloom_state(self):
+        return _file_signature(self.path), _file_signature(self.journal_path)
+
+    def _bloom_tracks(self) -> bool:
+        # A group commit leaves the records unsynced when the stamp would be
+        # written, so the filter stays behind and readers scan the journal
+        # tail until the next compaction rebuilds it.
+        return bool(BLOOM_FP_RATE) and not (FSYNC and GROUP_COMMIT_WINDOW > 0)
+
+    def _write_added(self, index: VaultIndex, entries: list[Entry]):
+        self._log([{"op": "add", "entry": e.to_dict()} for e in entries])
+
+    def _write_removed(self, index: VaultIndex, ids: list[int]):
+        self._log([{"op": "del", "id": i} for i in ids])
+
+    def _write_updated(self, index: VaultIndex, entries: list[Entry]):
+        self._log([{"op": "set", "entry": e.to_dict()} for e in entries])
+
+    def compact(self):
+        """Fold the journal into a fresh XML snapshot."""
+        with self.lock:
+            self._snapshot(self.ensure_loaded().entries)
+
+    def _maybe_compact(self):
+        if self._pending >= JOURNAL_COMPACT_EVERY:
+            self.compact()
+
+
+class SQLiteStorage:
+    """SQLite database next to DB_FILE (vault_database.sqlite3).
+
+    Lookups hit the index on username_hash, and updates and deletes the
+    primary key, which doubles as the entry id.
+    The database runs in WAL mode and every mutation is one transaction.
+    Statements are fixed SQL with bound parameters, so sqlite3's statement
+    cache prepares each one only once. If the database is new and an XML
+    vault exists at `path`, it is migrated once on open, even when several
+    processes open it at the same time.
+    """
+    SCHEMA_VERSION = 4
+    BUSY_TIMEOUT   = 30.0    # seconds to wait for another connection's lock
+    _COLUMNS = ", ".join(("id",) + ENTRY_FIELDS)
+    _SELECT  = f"SELECT {_COLUMNS} FROM entries"
+    _INSERT  = f"INSERT INTO entries ({_COLUMNS}) VALUES ({', '.join('?' * (len(ENTRY_FIELDS) + 1))})"
+    _UPDATE  = f"UPDATE entries SET {', '.join(f'{k} = ?' for k in ENTRY_FIELDS)} WHERE id = ?"
+    # Sort expressions for query(), each matching one of the indexes
+    _ORDER_BY = {"created":  "created",
+                 "username": "username COLLATE NOCASE",
+                 "label":    "label COLLATE NOCASE"}
+
+    def __init__(self, path: str):
+        import sqlite3    # deferred: keeps `import vault_core` cheap for XML users
+        self.path    = path
+        self.db_path = os.path.splitext(path)[0] + ".sqlite3"
+        self.conn    = sqlite3.connect(self.db_path, timeout=self.BUSY_TIMEOUT,
+                                       isolation_level=None, check_same_thread=False)
+        self.lock    = threading.RLock()    # one transaction at a time on this connection
+        self._enable_wal()
+        # FULL syncs every commit; NORMAL (group commit) only syncs the WAL at
+        # checkpoints, trading the last few commits on power loss for speed
+        self.conn.execute("PRAGMA synchronous=" + (
+            "OFF" if not FSYNC else "NORMAL" if GROUP_COMMIT_WINDOW > 0 else "FULL"))
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version == 0:
+            self._create()
+        elif version < self.SCHEMA_VERSION:
+            self._upgrade(version)
+        self._count = self.conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        self._data_version = self._version()
+
+    def _enable_wal(self):
+        """Switch the database to WAL mode (a no-op once it is).
+
+        The switch needs the database to itself and does not wait in the
+        busy handler, so processes opening a new database together retry it.
+        """
+        import sqlite3
+        deadline = time.monotonic() + self.BUSY_TIMEOUT
+        while True:
+            try:
+                self.conn.execute("PRAGMA journal_mode=WAL")
+                return
+            except sqlite3.OperationalError:
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(0.01)
+
+    def _create(self):
+        """Create the schema and migrate an existing XML vault, atomically."""
+        with self._transaction() as cur:
+            # Another process may have done it since we read user_version
+            if cur.execute("PRAGMA user_version").fetchone()[0]:
+                return
+            cur.execute("""CREATE TABLE IF NOT EXISTS entries (
+                               id            INTEGER PRIMARY KEY AUTOINCREMENT,
+                               username      TEXT NOT NULL,
+                               username_hash TEXT NOT NULL,
+                               password_hash TEXT NOT NULL,
+                               created       TEXT NOT NULL,
+                               label         TEXT NOT NULL,
+                               hash_algo     TEXT NOT NULL DEFAULT 'md5',
+                               salt          TEXT NOT NULL DEFAULT '',
+                               hash_params   TEXT NOT NULL DEFAULT '')""")
+            cur.execute("CREATE INDEX IF NOT EXISTS entries_user ON entries (username_hash)")
+            self._create_search_indexes(cur)
+            # One-shot import of the XML vault (snapshot + journal), if any
+            cur.executemany(self._INSERT, self._rows(JournalStorage(self.path).iter_entries()))
+            cur.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+
+    def _upgrade(self, version: int):
+        """Bring a database written by an older VAULT up to SCHEMA_VERSION."""
+        with self._transaction() as cur:
+            version = cur.execute("PRAGMA user_version").fetchone()[0]    # may have moved on
+            if version >= self.SCHEMA_VERSION:
+                return
+            if version < 2:
+                # Per-entry hashing scheme; salted hashes make the pair index useless
+                cur.execute("ALTER TABLE entries ADD COLUMN hash_algo TEXT NOT NULL DEFAULT 'md5'")
+                cur.execute("ALTER TABLE entries ADD COLUMN salt TEXT NOT NULL DEFAULT ''")
+                cur.execute("ALTER TABLE entries ADD COLUMN hash_params TEXT NOT NULL DEFAULT ''")
+                cur.execute("DROP INDEX IF EXISTS entries_pair")
+            if version < 4:
+                # v3 added the search indexes, v4 the username sort index
+                self._create_search_indexes(cur)
+            cur.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+
+    @staticmethod
+    def _create_search_indexes(cur):
+        cur.execute("CREATE INDEX IF NOT EXISTS entries_label ON entries (label COLLATE NOCASE)")
+        cur.execute("CREATE INDEX IF NOT EXISTS entries_created ON entries (created)")
+        cur.execute("CREATE INDEX IF NOT EXISTS entries_name ON entries (username COLLATE NOCASE)")
+
+    def _transaction(self):
+        return _SQLiteTransaction(self.conn, self.lock)
+
+    @staticmethod
+    def _rows(entries):
+        # A missing id is NULL, which lets AUTOINCREMENT pick one; fields
+        # missing from pre-KDF journal records are stored empty (= md5)
+        return ([e.get("id")] + [e.get(key, "") for key in ENTRY_FIELDS] for e in entries)
+
+    @staticmethod
+    def _entry(row) -> Entry:
+        return Entry(*row)
+
+    def _version(self) -> int:
+        return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _check_external(self):
+        """Resync the cached row count if another connection committed."""
+        version = self._version()
+        if version != self._data_version:
+            self._data_version = version
+            self._count = self.conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            _notify("reset")
+
+    def load(self) -> list[Entry]:
+        return list(self.iter_entries())
+
+    def iter_entries(self):
+        self._check_external()
+        for row in self.conn.execute(self._SELECT + " ORDER BY id"):
+            yield self._entry(row)
+
+    def save(self, entries: list[dict]):
+        entries = [Entry.of(e) for e in entries]
+        _assign_ids(entries)
+        with self._transaction() as cur:
+            cur.execute("DELETE FROM entries")
+            cur.executemany(self._INSERT, self._rows(entries))
+        self._count = len(entries)
+        self._data_version = self._version()
+        _notify("reset")
+
+    def append(self, entry: dict):
+        self.extend([entry])
+
+    def extend(self, entries):
+        entries = [Entry.of(e) for e in entries]
+        self._check_external()
+        with self._transaction() as cur:
+            # The write lock is held, so AUTOINCREMENT would hand out exactly these
+            row = cur.execute("SELECT seq FROM sqlite_sequence WHERE name = 'entries'").fetchone()
+            next_id = (row[0] if row else 0) + 1
+            for entry_id, entry in enumerate(entries, next_id):
+                entry.id = entry_id
+            cur.executemany(self._INSERT, self._rows(entries))
+        for entry in entries:
+            _notify("insert", self._count, entry)
+            self._count += 1
+
+    def get(self, entry_id: int):
+        row = self.conn.execute(self._SELECT + " WHERE id = ?", (entry_id,)).fetchone()
+        return self._entry(row) if row else None
+
+    def count(self) -> int:
+        self._check_external()
+        return self._count
+
+    def _position(self, cur, entry_id: int):
+        # Positions are only needed for change events; skip the count otherwise
+        if not _listeners:
+            return None
+        return cur.execute("SELECT COUNT(*) FROM entries WHERE id < ?", (entry_id,)).fetchone()[0]
+
+    def update_many(self, entries, expected: dict = None) -> int:
+        self._check_external()
+        updated = []
+        with self._transaction() as cur:
+            for entry in map(Entry.of, entries):
+                values = [entry[key] for key in ENTRY_FIELDS] + [entry.id]
+                if expected is None:
+                    cur.execute(self._UPDATE, values)
+                else:
+                    cur.execute(self._UPDATE + " AND password_hash = ?",
+                                values + [expected[entry.id]])
+                if cur.rowcount:
+                    updated.append((self._position(cur, entry.id), entry))
+        for position, entry in updated:
+            _notify("update", position, entry)
+        return len(updated)
+
+    def remove(self, entry_id: int):
+        removed = self.remove_many([entry_id])
+        return removed[0] if removed else None
+
+    def remove_many(self, ids) -> list[Entry]:
+        self._check_external()
+        removed = []
+        with self._transaction() as cur:
+            for entry_id in sorted(set(ids), reverse=True):
+                row = cur.execute(self._SELECT + " WHERE id = ?", (entry_id,)).fetchone()
+                if row is None:
+                    continue
+                position = self._position(cur, entry_id)
+                cur.execute("DELETE FROM entries WHERE id = ?", (entry_id,))
+                removed.append((position, self._entry(row)))
+        self._count -= len(removed)
+        for position, entry in removed:
+            _notify("delete", position, entry)
+        return [entry for _, entry in removed]
+
+    def flush(self):
+        self.conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def candidates(self, u_hash: str):
+        cur = self.conn.execute(self._SELECT + " WHERE username_hash = ? ORDER BY id", (u_hash,))
+        for row in cur:
+            yield self._entry(row)
+
+    def search(self, text: str = "", label: str = None,
+               since: str = None, until: str = None) -> list[Entry]:
+        """Entries matching a filter (see VaultIndex.search), in id order.
+
+        SQL narrows the rows: the label and date bounds use their indexes,
+        each word a LIKE substring test. The word-prefix rule, and case
+        folding beyond ASCII that LIKE/NOCASE lack, are checked here.
+        """
+        words = set(_words(text))
+        conds, params = [], []
+        for w in words:
+            if w.isascii():
+                conds.append(r"(username LIKE ? ESCAPE '\' OR label LIKE ? ESCAPE '\')")
+                params += ["%" + re.sub(r"([\\%_])", r"\\\1", w) + "%"] * 2
+        if label is not None and label.isascii():
+            conds.append("label = ? COLLATE NOCASE")
+            params.append(label)
+        if since:
+            conds.append("created >= ?")
+            params.append(since)
+        if until:
+            conds.append("created < ?")
+            params.append(until + _TOP)
+        self._check_external()
+        where = " WHERE " + " AND ".join(conds) if conds else ""
+        rows = self.conn.execute(self._SELECT + where + " ORDER BY id", params)
+        return [e for e in map(self._entry, rows) if _matches_words(e, words) and (
+            label is None or e.label.casefold() == label.casefold())]
+
+    def query(self, order_by: str = "created", descending: bool = False,
+              limit: int = None, offset: int = 0, after: Entry = None) -> list[Entry]:
+        """One page of entries in sort order, walked along the column's index.
+
+        Case-insensitive order here is SQLite's NOCASE (ASCII only), so
+        keyset pages stay consistent within this backend.
+        """
+        col = self._ORDER_BY[order_by]
+        op, direction = ("<", "DESC") if descending else (">", "ASC")
+        where, params = "", []
+        if after is not None:
+            # The leading bound lets SQLite seek the index to the mark
+            where = f" WHERE {col} {op}= ? AND ({col} {op} ? OR id {op} ?)"
+            params = [after[order_by], after[order_by], after["id"]]
+        self._check_external()
+        rows = self.conn.execute(
+            f"{self._SELECT}{where} ORDER BY {col} {direction}, id {direction} LIMIT ? OFFSET ?",
+            params + [-1 if limit is None else max(limit, 0), max(offset, 0)])
+        return [self._entry(row) for row in rows]
+
+
+class _SQLiteTransaction:
+    """BEGIN IMMEDIATE … COMMIT, rolled back if the block raises.
+
+    Holds the storage's thread lock throughout, so a background rehash and
+    the caller's own writes never interleave on the shared connection.
+    """
+    def __init__(self, conn, lock):
+        self.conn = conn
+        self.lock = lock
+
+    def __enter__(self):
+        self.lock.acquire()
+        try:
+            self.conn.execute("BEGIN IMMEDIATE")
+        except BaseException:
+            self.lock.release()
+            raise
+        return self.conn.cursor()
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self.lock.release()
+        return False
+
+
+def migrate_xml_to_sqlite(xml_path: str = None) -> int:
+    """Copy an XML vault (snapshot + journal) into its SQLite database.
+
+    Normally this happens by itself the first time the sqlite backend opens
+    a vault; call it directly to re-run it. Returns the number of entries.
+    """
+    xml_path = xml_path or DB_FILE
+    storage = SQLiteStorage(xml_path)
+    storage.save(list(JournalStorage(xml_path).iter_entries()))
+    return storage._count
+
+
+def _shard_number(entry_or_hash, count: int) -> int:
+    """Shard of a username: the first 32 bits of its hash, modulo `count`."""
+    return int.from_bytes(_user_key(entry_or_hash)[:4], "big") % count
+
+
+def _ids_below(entries: list[Entry], entry_id: int) -> int:
+    """How many of the id-ordered `entries` have an id below `entry_id`."""
+    lo, hi = 0, len(entries)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if entries[mid].id < entry_id:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+class _ShardIndex(VaultIndex):
+    """VaultIndex of one shard. It hands out only ids congruent to its
+    shard number, so shards never need a shared counter to stay unique."""
+    def __init__(self, number: int, stride: int):
+        super().__init__()
+        self.number = number
+        self.stride = stride
+
+    def new_id(self) -> int:
+        entry_id = self.next_id + (self.number - self.next_id) % self.stride
+        self.next_id = entry_id + 1
+        return entry_id
+
+
+class _Shard(JournalStorage):
+    """One shard of a ShardedStorage: a journal vault of its own whose
+    change events are renumbered to positions in the merged vault."""
+    def __init__(self, path: str, number: int, count: int, owner=None):
+        super().__init__(path)
+        self.index = _ShardIndex(number, count)
+        self.owner = owner
+        if owner is not None:    # one mutex over every shard's index, for merged reads
+            self.lock.mutex = owner.lock.mutex
+
+    def _notify(self, kind: str, index: int = None, entry: dict = None):
+        if index is not None and _listeners and self.owner is not None:
+            index += self.owner._ids_before(entry.id, self)
+        _notify(kind, index, entry)
+
+
+class ShardedStorage:
+    """The vault split over several journal vaults by username hash.
+
+    Shard k holds the usernames whose hash prefix is k modulo the shard
+    count, with its own snapshot, journal, lock, index, Bloom filter and
+    binary snapshot under `<DB_FILE stem>.shards/`. A lookup reads one
+    shard, writes to different shards take different file locks, and a
+    compaction rewrites one shard rather than the vault.
+
+    Every shard keeps its entries in id order, so whole-vault reads (load,
+    export, search) are a streaming k-way merge by id, and change events
+    carry positions in that merged order. Within one process, writes still
+    take turns, which keeps those positions consistent, while reads share
+    one mutex with every shard and so see each write whole.
+
+    The shard count comes from SHARDS when the directory is created and
+    is recorded in its manifest. At that point the XML/journal vault at
+    `path`, if any, is copied in with its ids. An entry never changes
+    shard, so update_many refuses to change a username.
+    """
+    MANIFEST = "manifest.json"
+    _ID = operator.attrgetter("id")
+
+    def __init__(self, path: str):
+        self.path   = path
+        self.dir    = os.path.splitext(path)[0] + ".shards"
+        self.lock   = _FileLock(self.dir)    # creating the directory; .writer orders our writes
+        self.shards = self._open_shards(self.dir, self._manifest()["shards"], self)
+
+    @staticmethod
+    def _open_shards(directory: str, count: int, owner=None) -> list:
+        return [_Shard(os.path.join(directory, f"shard{k:03d}.xml"), k, count, owner)
+                for k in range(count)]
+
+    def _manifest(self) -> dict:
+        manifest = os.path.join(self.dir, self.MANIFEST)
+        if not os.path.exists(manifest):
+            with self.lock:
+                if not os.path.exists(manifest):
+                    self._create()
+        try:
+            with open(manifest, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as exc:
+            raise VaultCorruptError(f"{manifest}: {exc}") from exc
+
+    def _create(self):
+        """Build the shard directory next to its final name, then rename it
+        into place, so other processes see all of it or none."""
+        if os.path.isdir(self.dir):
+            raise VaultCorruptError(f"{self.dir}: no {self.MANIFEST}")
+        tmp = self.dir + ".tmp"
+        shutil.rmtree(tmp, ignore_errors=True)    # left by an interrupted creation
+        os.makedirs(tmp)
+        count = max(1, SHARDS)
+        self._fill(self._open_shards(tmp, count), JournalStorage(self.path).iter_entries())
+        with open(os.path.join(tmp, self.MANIFEST), "w", encoding="utf-8") as f:
+            json.dump({"shards": count}, f)
+            if FSYNC:
+                f.flush()
+                os.fsync(f.fileno())
+        os.rename(tmp, self.dir)
+        if FSYNC:
+            _fsync_dir(self.dir)
+
+    @classmethod
+    def _fill(cls, shards: list, entries):
+        """Snapshot `entries` into `shards`, whose file locks the caller holds.
+
+        Entries without an id get one above any id handed out so far, and
+        every shard's counter moves past them all.
+        """
+        entries = [Entry.of(e) for e in entries]
+        next_id = max([1] + [max(s.index.next_id, _read_header(s.path).get("next_id", 1))
+                             for s in shards])
+        next_id = _assign_ids(entries, next_id)
+        parts = [[] for _ in shards]
+        for e in entries:
+            parts[_shard_number(e, len(shards))].append(e)
+        for shard, part in zip(shards, parts):
+            part.sort(key=cls._ID)
+            shard.index.next_id = next_id
+            shard._snapshot(part)
+
+    def _shard(self, entry_or_hash) -> _Shard:
+        return self.shards[_shard_number(entry_or_hash, len(self.shards))]
+
+    def _split(self, entries: list[Entry]) -> dict:
+        parts = {}
+        for e in entries:
+            parts.setdefault(self._shard(e), []).append(e)
+        return parts
+
+    def _owner(self, entry_id: int):
+        """The shard holding `entry_id`, or None. The shard that handed the
+        id out is asked first; only ids copied in can live elsewhere."""
+        home = entry_id % len(self.shards)
+        for shard in [self.shards[home]] + self.shards[:home] + self.shards[home + 1:]:
+            if entry_id in shard.ensure_loaded().by_id:
+                return shard
+        return None
+
+    def _ids_before(self, entry_id: int, shard: _Shard) -> int:
+        """Entries of the other shards that precede `entry_id` in the merged order."""
+        return sum(_ids_below(s.index.entries, entry_id) for s in self.shards if s is not shard)
+
+    def load(self) -> list[Entry]:
+        with self.lock.mutex:
+            return self._merged(s.ensure_loaded().entries for s in self.shards)
+
+    def iter_entries(self):
+        yield from heapq.merge(*(s.iter_entries() for s in self.shards), key=self._ID)
+
+    @classmethod
+    def _merged(cls, runs) -> list[Entry]:
+        """Id-ordered lists merged into one. Unlike iter_entries' heap merge,
+        this runs in C: timsort finds the runs and merges them pairwise."""
+        return sorted(itertools.chain.from_iterable(runs), key=cls._ID)
+
+    def save(self, entries: list[dict]):
+        with self.lock.writer, ExitStack() as stack:
+            for shard in self.shards:
+                stack.enter_context(shard.lock)
+            self._fill(self.shards, entries)
+        _notify("reset")
+
+    def append(self, entry: dict):
+        self.extend([entry])
+
+    def extend(self, entries):
+        """Store entries, one write per shard they fall in, giving each a fresh id."""
+        entries = [Entry.of(e) for e in entries]
+        with self.lock.writer:
+            for shard, part in self._split(entries).items():
+                shard.extend(part)
+
+    def get(self, entry_id: int):
+        shard = self._owner(entry_id)
+        return shard.get(entry_id) if shard is not None else None
+
+    def count(self) -> int:
+        return sum(s.count() for s in self.shards)
+
+    def update_many(self, entries, expected: dict = None) -> int:
+        entries = [Entry.of(e) for e in entries]
+        with self.lock.writer:
+            for e in entries:
+                if e.id not in self._shard(e).ensure_loaded().by_id and \
+                        self._owner(e.id) is not None:
+                    raise ValueError(f"entry {e.id}: the sharded backend cannot change a username")
+            return sum(shard.update_many(part, expected)
+                       for shard, part in self._split(entries).items())
+
+    def remove(self, entry_id: int):
+        removed = self.remove_many([entry_id])
+        return removed[0] if removed else None
+
+    def remove_many(self, ids) -> list[Entry]:
+        with self.lock.writer:
+            parts = {}
+            for entry_id in dict.fromkeys(ids):
+                shard = self._owner(entry_id)
+                if shard is not None:
+                    parts.setdefault(shard, []).append(entry_id)
+            return [e for shard, part in parts.items() for e in shard.remove_many(part)]
+
+    def flush(self):
+        for shard in self.shards:
+            shard.flush()
+
+    def compact(self):
+        for shard in self.shards:
+            shard.compact()
+
+    def candidates(self, u_hash: str):
+        return self._shard(u_hash).candidates(u_hash)
+
+    def search(self, text: str = "", label: str = None,
+               since: str = None, until: str = None) -> list[Entry]:
+        """Entries matching a filter, merged by id from every shard's index."""
+        with self.lock.mutex:
+            return self._merged(s.search(text, label, since, until) for s in self.shards)
+
+    def query(self, order_by: str = "created", descending: bool = False,
+              limit: int = None, offset: int = 0, after: Entry = None) -> list[Entry]:
+        """One page of entries in sort order (see VaultIndex.query).
+
+        The page is a range of ranks in the merged order. Its ends are
+        found by bisecting every shard's sorted (key, id) list, so only
+        the page itself is merged, at any offset.
+        """
+        with self.lock.mutex:
+            indexes = [s.ensure_loaded() for s in self.shards]
+            keys = [index._order(order_by) for index in indexes]
+            total = sum(map(len, keys))
+            if after is not None:
+                mark = (_ORDER_KEYS[order_by](Entry.of(after)), after["id"])
+                cut = bisect.bisect_left if descending else bisect.bisect_right
+                base = sum(cut(k, mark) for k in keys)
+            else:
+                base = total if descending else 0
+            if descending:
+                high = max(base - max(offset, 0), 0)
+                low = 0 if limit is None else max(high - max(limit, 0), 0)
+            else:
+                low = min(base + max(offset, 0), total)
+                high = total if limit is None else min(low + max(limit, 0), total)
+            page = sorted(itertools.chain.from_iterable(
+                [(key, entry_id, index.by_id[entry_id]) for key, entry_id in k[i:j]]
+                for index, k, i, j in zip(indexes, keys, self._cuts(keys, low),
+                                          self._cuts(keys, high))))
+        return [row[2] for row in (reversed(page) if descending else page)]
+
+    @staticmethod
+    def _cuts(keys: list, rank: int) -> list[int]:
+        """Positions in each sorted list that together split off the `rank`
+        smallest items of their union.
+
+        Keeps a window per list known to hold its cut and bisects every
+        window at the middle item of the widest one, so all of them narrow
+        at once: about log(total) rounds of one bisect per list.
+        """
+        lo, hi = [0] * len(keys), [len(k) for k in keys]
+        if rank >= sum(hi):
+            return hi
+        while True:
+            widest = max(range(len(keys)), key=lambda t: hi[t] - lo[t])
+            if lo[widest] == hi[widest]:
+                return lo
+            pivot = keys[widest][(lo[widest] + hi[widest]) // 2]
+            cuts = [bisect.bisect_left(k, pivot, lo[t], hi[t]) for t, k in enumerate(keys)]
+            below = sum(cuts)
+            if below == rank:
+                return cuts
+            if below < rank:
+                lo = cuts
+                lo[widest] += 1    # the pivot itself is among the smallest too
+            else:
+                hi = cuts
+
+
+_BACKENDS = {"xml": XMLStorage, "journal": JournalStorage, "sqlite": SQLiteStorage,
+             "sharded": ShardedStorage}
+_storage = None
+
+
+def get_storage():
+    """Return the storage backend for the current DB_FILE / STORAGE_BACKEND."""
+    global _storage
+    cls = _BACKENDS[STORAGE_BACKEND]
+    if type(_storage) is not cls or _storage.path != DB_FILE:
+        _storage = cls(DB_FILE)
+    return _storage
+
+
+def load_db() -> list[Entry]:
+    """Load entries from the vault. Returns a list of Entry records.
+
+    Served from the in-memory index while the files on disk are unchanged,
+    and on a cold start from the binary snapshot when it mirrors the XML;
+    the records are shared with the index. They read like dicts; use
+    dict(e) or e.to_dict() where a real, mutable dict is needed.
+    """
+    return get_storage().load()
+
+
+def iter_entries():
+    """Lazily yield vault entries in file order.
+
+    Streams the XML with iterparse when the resident index is not loaded,
+    so a caller that stops early only pays for what it reads.
+    """
+    return get_storage().iter_entries()
+
+
+def save_db(entries: list[dict]):
+    """Replace the vault contents with `entries`."""
+    get_storage().save(entries)
+
+
+def flush():
+    """Force writes still waiting for a group commit onto disk now."""
+    get_storage().flush()
+
+
+def make_entry(username: str, password: str, label: str = "", hashed: dict = None) -> Entry:
+    """Build a vault entry for a credential without storing it.
+
+    `hashed` is a precomputed hash_password() result; by default the
+    password is hashed here with HASH_ALGO. The username hash stays MD5:
+    it is only the lookup key. Raises ValueError for control characters
+    and other text XML cannot hold.
+    """
+    check_text("username", username)
+    check_text("label", label)
+    hashed = hashed or hash_password(password)
+    return Entry(
+        username=username,
+        username_hash=md5_hash(username),
+        password_hash=hashed["password_hash"],
+        created=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        label=label or "Default",
+        hash_algo=hashed["hash_algo"],
+        salt=hashed["salt"],
+        hash_params=hashed["hash_params"],
+    )
+
+
+def add_entry(username: str, password: str, label: str = "", salt: str = None) -> Entry:
+    entry = make_entry(username, password, label, hash_password(password, salt=salt))
+    get_storage().append(entry)
+    return entry
+
+
+def add_entries(credentials) -> list[Entry]:
+    """Hash and store many credentials with a single load/merge/write.
+
+    `credentials` yields (username, password) or (username, password, label).
+    The passwords are hashed as one batch across HASH_WORKERS processes.
+    """
+    credentials = [tuple(cred) for cred in credentials]
+    hashes = hash_passwords([cred[1] for cred in credentials])
+    entries = [make_entry(cred[0], cred[1], cred[2] if len(cred) > 2 else "", hashed)
+               for cred, hashed in zip(credentials, hashes)]
+    get_storage().extend(entries)
+    return entries
+
+
+def import_entries(entries) -> int:
+    """Store already-hashed entries (e.g. from an export) in one write.
+
+    Ids from the source are dropped; the entries get fresh ones here.
+    Raises ValueError, storing nothing, if a field holds text XML cannot hold.
+    """
+    entries = [{key: check_text(key, str(e.get(key) or "")) for key in ENTRY_FIELDS}
+               for e in entries]
+    for e in entries:
+        e["label"] = e["label"] or "Default"
+        e["hash_algo"] = e["hash_algo"] or "md5"
+    get_storage().extend(entries)
+    return len(entries)
+
+
+def search_entries(text: str = "", label: str = None, since: str = None,
+                   until: str = None, order_by: str = None, descending: bool = False) -> list[Entry]:
+    """Entries matching a filter, in file order or sorted by `order_by`.
+
+    Every word of `text` must start a word of the username or label
+    ("gi" finds "GitHub" and "gil@example.com"); `label` matches a whole
+    label ignoring case; `since`/`until` are inclusive "YYYY-MM-DD" (or
+    shorter, e.g. "2024-03") bounds on `created`. The XML backends answer
+    from the resident index with bisects over sorted word and date keys.
+    `order_by` takes the fields of query_entries(); only the matches are sorted.
+    """
+    entries = get_storage().search(text, label, since, until)
+    if order_by is not None:
+        key = _ORDER_KEYS[order_by]
+        entries.sort(key=lambda e: (key(e), e.id), reverse=descending)
+    return entries
+
+
+def query_entries(order_by: str = "created", descending: bool = False,
+                  limit: int = None, offset: int = 0, after: Entry = None) -> list[Entry]:
+    """One page of entries sorted by "created", "username" or "label".
+
+    Ties are broken by id. Page with `limit`/`offset`, or pass the last
+    entry of the previous page as `after` (keyset pagination), which stays
+    correct while entries are added or deleted between pages:
+
+        page = query_entries("label", limit=50)
+        page = query_entries("label", limit=50, after=page[-1])
+
+    Served from sorted indexes: a keyset page costs O(log N + page). So does
+    an offset on the XML backends; SQLite steps over the skipped rows.
+    """
+    if order_by not in _ORDER_KEYS:
+        raise ValueError(f"cannot order by {order_by!r}; use one of {', '.join(_ORDER_KEYS)}")
+    return get_storage().query(order_by, descending, limit, offset, after)
+
+
+def count_entries() -> int:
+    """Number of entries in the vault, from the resident index or SQLite's row count."""
+    return get_storage().count()
+
+
+def get_entry(entry_id: int):
+    """Return the entry with `entry_id`, or None."""
+    return get_storage().get(entry_id)
+
+
+def delete_entry(entry_id: int):
+    """Delete the entry with `entry_id`. Returns it, or None if it was already gone."""
+    return get_storage().remove(entry_id)
+
+
+def delete_entries(ids) -> int:
+    """Delete several entries by id with a single write. Returns the count."""
+    return len(get_storage().remove_many(ids))
+
+
+def lookup_entry(username: str, password: str):
+    """Return matching entry if credentials match.
+
+    Candidates come from the username-hash index in O(1); each is checked
+    under its own algorithm, MD5 ones inline and several KDF ones as one
+    parallel batch. A match hashed with an outdated scheme is rehashed with
+    HASH_ALGO in the background (rehash on login).
+    """
+    storage = get_storage()
+    match, slow = None, []
+    for entry in storage.candidates(md5_hash(username)):
+        if not _HASHERS[entry.get("hash_algo") or "md5"][2]:
+            slow.append(entry)
+        elif verify_password(password, entry):
+            match = entry
+            break
+    else:
+        checks = verify_passwords((password, e) for e in slow)
+        match = next((e for e, ok in zip(slow, checks) if ok), None)
+    if match is not None and needs_rehash(match):
+        _rehash_later(storage, match, password)
+    return match
+
+
+def _rehash_later(storage, entry: dict, password: str):
+    """Rewrite `entry` under HASH_ALGO without holding up the lookup."""
+    def _store(hashed):
+        storage.update_many([dict(entry, **hashed)], {entry["id"]: entry["password_hash"]})
+    job = (password, HASH_ALGO, HASH_PARAMS.get(HASH_ALGO, {}), None)
+    if _HASHERS[HASH_ALGO][2]:
+        _store(_hash_job(job))
+        return
+    if (HASH_WORKERS or os.cpu_count() or 1) == 1:    # no pool: a thread of our own
+        threading.Thread(target=lambda: _store(_hash_job(job)), name="vault-rehash").start()
+        return
+    def _done(future):
+        if future.exception() is None:
+            _store(future.result())
+    _hash_pool().submit(_hash_job, job).add_done_callback(_done)
+
+
+def bloom_stats() -> dict:
+    """Counters of the negative-lookup Bloom filter in this process, plus its shape.
+
+    checks: lookups made without a fresh resident index, which ask the
+    filter first; rejected: answered "no such user" by the filter alone;
+    passed: went on to the vault, false_positives of them finding nothing;
+    unavailable: no filter matched the files on disk, so the vault was
+    read. Empty for SQLite, whose username_hash index answers misses.
+    The sharded backend reports its shards' filters summed, with the mean
+    estimated false-positive rate.
+    """
+    storage = get_storage()
+    blooms = [s.bloom for s in getattr(storage, "shards", [storage]) if hasattr(s, "bloom")]
+    if not blooms:
+        return {}
+    stats = {key: sum(b.stats[key] for b in blooms) for key in blooms[0].stats}
+    heads = [head for head in (b.header() for b in blooms) if head is not None]
+    if heads:
+        stats.update(capacity=sum(h["capacity"] for h in heads),
+                     keys=sum(h["count"] for h in heads), bits=sum(h["bits"] for h in heads),
+                     hashes=heads[0]["hashes"], estimated_fp_rate=sum(
+                         (1 - math.exp(-h["hashes"] * h["count"] / h["bits"])) ** h["hashes"]
+                         for h in heads) / len(heads))
+    return stats
+
+
+def percentile(sorted_samples: list[float], pct: float) -> float:
+    """Nearest-rank `pct` percentile of an ascending, non-empty list of samples."""
+    k = max(0, min(len(sorted_samples) - 1, round(pct / 100 * len(sorted_samples)) - 1))
+    return sorted_samples[k]
+
+
+def export_xml(path: str):
+    """Write the whole vault as a standalone XML file at `path`, gzip or xz
+    compressed if it ends in .gz or .xz."""
+    _write_xml(path, iter_entries(), compression=_compression_of(path))
+
+
+def import_xml(path: str) -> int:
+    """Append every entry of the XML file at `path`. Returns the count."""
+    return import_entries(_iter_xml(path))
+
+
+# ─── HASH MIGRATION ───────────────────────────────────────────────────────────
+class HashMigration:
+    """Upgrades legacy MD5 entries in the background.
+
+    Without the password an MD5 hash can only be wrapped: the entry is
+    rehashed with HASH_ALGO over its stored MD5 digest (hash_algo
+    "<algo>_md5"), which still verifies against the password but costs an
+    attacker a full KDF per guess. The next successful lookup swaps the
+    wrapped hash for a plain HASH_ALGO one (rehash on login).
+
+    Entries go in batches of MIGRATE_BATCH: the KDF work of a batch is
+    spread over the hashing pool and the batch is written back with one
+    update_many (one journal append, rewrite or transaction). An entry
+    changed meanwhile, e.g. rehashed on login, is skipped.
+    `on_progress(done, total, rate)` runs after each batch on the worker
+    thread.
+    """
+    def __init__(self, on_progress=None, batch_size: int = None):
+        self.on_progress = on_progress
+        self.batch_size  = batch_size or MIGRATE_BATCH
+        self.done        = 0
+        self.total       = 0
+        self._started    = None
+        self._finished   = None
+        self._stop       = threading.Event()
+        self._thread     = None
+
+    @property
+    def rate(self) -> float:
+        """Entries upgraded per second so far."""
+        if not self._started:
+            return 0.0
+        elapsed = (self._finished or time.perf_counter()) - self._started
+        return self.done / elapsed if elapsed else 0.0
+
+    def start(self) -> "HashMigration":
+        """Run the migration on a daemon thread."""
+        self._thread = threading.Thread(target=self.run, name="vault-hash-migration",
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Finish the batch in flight, then stop."""
+        self._stop.set()
+
+    def join(self, timeout: float = None):
+        if self._thread:
+            self._thread.join(timeout)
+
+    def run(self) -> int:
+        """Upgrade every pending entry on the calling thread. Returns the count."""
+        algo = HASH_ALGO
+        if _HASHERS[algo][2]:
+            return 0    # target is no stronger than MD5
+        params = HASH_PARAMS.get(algo, {})
+        storage = get_storage()
+        pending = [e for e in storage.iter_entries() if (e.get("hash_algo") or "md5") == "md5"]
+        self.total, self._started = len(pending), time.perf_counter()
+        for start in range(0, len(pending), self.batch_size):
+            if self._stop.is_set():
+                break
+            batch = pending[start:start + self.batch_size]
+            hashes = _run_jobs(_hash_job, [(e["password_hash"], algo, params, None)
+                                           for e in batch], False)
+            upgraded = []
+            for entry, hashed in zip(batch, hashes):
+                new = dict(entry, **hashed)
+                new["hash_algo"] = algo + "_md5"
+                upgraded.append(new)
+            # Entries deleted or changed meanwhile are skipped, so count what was stored
+            self.done += storage.update_many(upgraded, {e["id"]: e["password_hash"] for e in batch})
+            if self.on_progress:
+                self.on_progress(self.done, self.total, self.rate)
+        self._finished = time.perf_counter()
+        return self.done
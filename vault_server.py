@@ -0,0 +1,440 @@
+"""
+VAULT — local verification service
+
+Lets other local services check credentials against the vault without
+importing it or re-reading the XML for every check. One asyncio process
+keeps the vault resident (vault_core's in-memory index) and answers
+requests over a Unix socket or localhost TCP, one JSON object per line
+each way:
+
+    → {"id": 1, "op": "lookup", "username": "alice", "password": "hunter2"}
+    ← {"id": 1, "ok": true, "result": {"id": 17, "username": "alice", ...}}
+
+Ops: lookup (username, password → the entry, or null if they do not
+match), add (username, password[, label] → the new entry), delete
+(entry: an entry id → true/false) and count. Requests on one connection
+may be pipelined; responses carry the request's "id" and can arrive out
+of order. A failed request answers {"id": ..., "ok": false, "error": "..."}.
+
+Usage:
+    python vault_server.py serve                       # Unix socket <DB_FILE>.sock
+    python vault_server.py --tcp 127.0.0.1:7420 serve
+    python vault_server.py load --users 200 --requests 20000 --clients 16
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import signal
+import socket
+import stat
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import vault_core as vault
+
+DEFAULT_PORT = 7420
+MAX_INFLIGHT = 256    # requests of one connection served at once before reading pauses
+
+
+class VaultServiceError(Exception):
+    """The server answered a request with an error."""
+
+
+def _text(request: dict, name: str) -> str:
+    value = request.get(name)
+    if not isinstance(value, str):
+        raise ValueError(f"'{name}' must be a string")
+    return value
+
+
+# ─── SERVER ───────────────────────────────────────────────────────────────────
+class VaultServer:
+    """Answers JSON-lines requests from one event loop and one resident vault.
+
+    Lookups and counts run on a thread pool, so the loop keeps reading while
+    a KDF verifies; hashlib's scrypt and PBKDF2 release the GIL, so checks
+    against salted entries run on every core. Adds and deletes are queued
+    for a single writer task, which stores everything queued since its last
+    write with one add_entries() / remove_many() call: a burst of writes
+    shares one hashing batch, one file lock and one fsync.
+    """
+    def __init__(self, workers: int = None):
+        self.executor = ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1,
+                                           thread_name_prefix="vault-server")
+        self.served   = 0
+        self._writes  = None
+        self._writer  = None
+        self._server  = None
+        self._path    = None
+
+    async def start(self, path: str = None, host: str = None, port: int = DEFAULT_PORT):
+        """Load the vault, then listen on the Unix socket `path` or on host:port."""
+        self._writes = asyncio.Queue()
+        self._writer = asyncio.ensure_future(self._write_loop())
+        await self._run(vault.count_entries)    # build the resident index before the first client
+        if host is None:
+            self._path = path
+            self._server = await asyncio.start_unix_server(self.serve_client, sock=_bind_unix(path))
+        else:
+            self._server = await asyncio.start_server(self.serve_client, host, port)
+
+    async def close(self):
+        """Stop accepting, finish the queued writes and flush them to disk."""
+        self._server.close()
+        await self._writes.join()
+        self._writer.cancel()
+        await self._run(vault.flush)
+        self.executor.shutdown(wait=False)
+        if self._path:
+            os.unlink(self._path)
+
+    def _run(self, fn, *args):
+        return asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    async def serve_client(self, reader, writer):
+        slots = asyncio.Semaphore(MAX_INFLIGHT)
+        sending = asyncio.Lock()
+        tasks = set()
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:    # longer than the stream limit: the framing is lost
+                    await self._send(writer, sending, {"id": None, "ok": False,
+                                                       "error": "request line too long"})
+                    break
+                if not line:
+                    break
+                await slots.acquire()
+                task = asyncio.ensure_future(self._answer(line, writer, sending, slots))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.wait(tasks)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _answer(self, line: bytes, writer, sending, slots):
+        request_id = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("a request must be a JSON object")
+            request_id = request.get("id")
+            response = {"id": request_id, "ok": True, "result": await self.handle(request)}
+        except Exception as exc:    # one bad request must not take the service down
+            response = {"id": request_id, "ok": False, "error": str(exc) or type(exc).__name__}
+        try:
+            await self._send(writer, sending, response)
+        finally:
+            self.served += 1
+            slots.release()
+
+    @staticmethod
+    async def _send(writer, sending, response: dict):
+        # One write per line and one drain at a time: concurrent drains are not allowed
+        async with sending:
+            writer.write(json.dumps(response).encode() + b"\n")
+            try:
+                await writer.drain()
+            except ConnectionError:
+                pass
+
+    async def handle(self, request: dict):
+        """Run one request; returns its result or raises for an error response."""
+        op = request.get("op")
+        if op == "lookup":
+            entry = await self._run(vault.lookup_entry, _text(request, "username"),
+                                    _text(request, "password"))
+            return entry.to_dict() if entry is not None else None
+        if op == "count":
+            return await self._run(vault.count_entries)
+        if op == "add":
+            label = request.get("label") or ""
+            if not isinstance(label, str):
+                raise ValueError("'label' must be a string")
+            # Checked here, not in the batch, so one bad add fails alone
+            username = vault.check_text("username", _text(request, "username"))
+            vault.check_text("label", label)
+            return await self._queue("add", (username, _text(request, "password"), label))
+        if op == "delete":
+            entry_id = request.get("entry")    # "id" is taken by the request id
+            if not isinstance(entry_id, int) or isinstance(entry_id, bool):
+                raise ValueError("'entry' must be an entry id")
+            return await self._queue("delete", entry_id)
+        raise ValueError(f"unknown op {op!r}; use lookup, add, delete or count")
+
+    def _queue(self, op: str, args):
+        future = asyncio.get_running_loop().create_future()
+        self._writes.put_nowait((op, args, future))
+        return future
+
+    async def _write_loop(self):
+        while True:
+            batch = [await self._writes.get()]
+            while not self._writes.empty():
+                batch.append(self._writes.get_nowait())
+            try:
+                results = await self._run(self._apply, [(op, args) for op, args, _ in batch])
+            except Exception as exc:
+                results = [exc] * len(batch)
+            for (_, _, future), result in zip(batch, results):
+                if future.done():
+                    pass
+                elif isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+                self._writes.task_done()
+
+    @staticmethod
+    def _apply(batch: list) -> list:
+        """Store a batch of queued writes. Returns one result or exception per write."""
+        results = [None] * len(batch)
+        adds = [(i, args) for i, (op, args) in enumerate(batch) if op == "add"]
+        deletes = [(i, args) for i, (op, args) in enumerate(batch) if op == "delete"]
+        if adds:
+            try:
+                entries = vault.add_entries([args for _, args in adds])
+                for (i, _), entry in zip(adds, entries):
+                    results[i] = entry.to_dict()
+            except Exception as exc:
+                for i, _ in adds:
+                    results[i] = exc
+        if deletes:
+            try:
+                removed = {e.id for e in vault.get_storage().remove_many([a for _, a in deletes])}
+                for i, entry_id in deletes:
+                    results[i] = entry_id in removed
+                    removed.discard(entry_id)    # a repeated delete in the batch finds nothing
+            except Exception as exc:
+                for i, _ in deletes:
+                    results[i] = exc
+        return results
+
+
+def _bind_unix(path: str) -> socket.socket:
+    """A Unix socket at `path` that only this user can connect to.
+
+    A socket file left behind by a server that died is replaced; one that
+    still answers means another server is running.
+    """
+    if os.path.exists(path) and stat.S_ISSOCK(os.stat(path).st_mode):
+        probe = socket.socket(socket.AF_UNIX)
+        try:
+            probe.connect(path)
+        except OSError:
+            os.unlink(path)
+        else:
+            raise SystemExit(f"A vault server is already listening on {path}")
+        finally:
+            probe.close()
+    sock = socket.socket(socket.AF_UNIX)
+    umask = os.umask(0o177)    # created 0600, with no window where others could connect
+    try:
+        sock.bind(path)
+    finally:
+        os.umask(umask)
+    return sock
+
+
+# ─── CLIENT ───────────────────────────────────────────────────────────────────
+class VaultClient:
+    """asyncio client for the service; concurrent calls share the connection.
+
+        client = await VaultClient.connect("/home/me/vault_database.xml.sock")
+        entry = await client.call("lookup", username="alice", password="hunter2")
+    """
+    def __init__(self, reader, writer):
+        self._reader  = reader
+        self._writer  = writer
+        self._ids     = itertools.count(1)
+        self._pending = {}
+        self._sending = asyncio.Lock()
+        self._reading = asyncio.ensure_future(self._read_loop())
+
+    @classmethod
+    async def connect(cls, path: str = None, host: str = None,
+                      port: int = DEFAULT_PORT) -> "VaultClient":
+        if host is None:
+            return cls(*await asyncio.open_unix_connection(path))
+        return cls(*await asyncio.open_connection(host, port))
+
+    async def call(self, op: str, **fields):
+        """Send one request and wait for its result; raises VaultServiceError on failure."""
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        async with self._sending:
+            self._writer.write(json.dumps({"id": request_id, "op": op, **fields}).encode() + b"\n")
+            await self._writer.drain()
+        response = await future
+        if not response["ok"]:
+            raise VaultServiceError(response["error"])
+        return response["result"]
+
+    async def _read_loop(self):
+        try:
+            async for line in self._reader:
+                response = json.loads(line)
+                future = self._pending.pop(response.get("id"), None)
+                if future is not None and not future.done():
+                    future.set_result(response)
+        finally:
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("the vault server closed the connection"))
+            self._pending.clear()
+
+    async def close(self):
+        self._writer.close()
+        self._reading.cancel()
+
+
+# ─── COMMANDS ─────────────────────────────────────────────────────────────────
+def _address(args) -> dict:
+    """connect()/start() keywords for the --socket / --tcp options."""
+    if args.tcp or not hasattr(socket, "AF_UNIX"):
+        host, _, port = (args.tcp or "").rpartition(":")
+        return {"host": host or "127.0.0.1", "port": int(port or DEFAULT_PORT)}
+    return {"path": args.socket or vault.DB_FILE + ".sock"}
+
+
+async def _serve(args):
+    server = VaultServer(args.workers)
+    address = _address(args)
+    await server.start(**address)
+    where = address.get("path") or f"{address['host']}:{address['port']}"
+    print(f"serving {vault.count_entries()} entries from {vault.DB_FILE} on {where}",
+          file=sys.stderr)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signum, stop.set)
+        except (NotImplementedError, RuntimeError):    # Windows: Ctrl+C raises instead
+            pass
+    try:
+        await stop.wait()
+    finally:
+        await server.close()
+        print(f"stopped after {server.served} requests", file=sys.stderr)
+
+
+def cmd_serve(args) -> int:
+    if args.hash_algo:
+        vault.HASH_ALGO = args.hash_algo
+    try:
+        asyncio.run(_serve(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+async def _load(args) -> dict:
+    """Seed users, fire lookups from --clients connections, then delete the users."""
+    address = _address(args)
+    admin = await VaultClient.connect(**address)
+    users = [(f"load{i:06d}", f"pw{i}") for i in range(args.users)]
+    seeded = await asyncio.gather(*(admin.call("add", username=u, password=p, label="Load")
+                                    for u, p in users))
+    clients = [await VaultClient.connect(**address) for _ in range(args.clients)]
+    rnd = random.Random(0)
+    todo = iter(range(args.requests))
+    samples, outcome = [], {"hits": 0, "misses": 0, "errors": 0}
+
+    async def worker(client):
+        for _ in todo:    # shared: each request is taken by whichever worker is free
+            username, password = rnd.choice(users)
+            miss = rnd.random() < args.miss_ratio
+            t0 = time.perf_counter()
+            try:
+                entry = await client.call("lookup", username=username,
+                                          password=password + "x" * miss)
+            except VaultServiceError:
+                outcome["errors"] += 1
+                continue
+            samples.append(time.perf_counter() - t0)
+            outcome["hits" if entry is not None else "misses"] += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker(c) for c in clients for _ in range(args.depth)))
+    elapsed = time.perf_counter() - t0
+
+    await asyncio.gather(*(admin.call("delete", entry=e["id"]) for e in seeded))
+    for client in clients + [admin]:
+        await client.close()
+    samples.sort()
+    return {
+        "requests":  args.requests,
+        "clients":   args.clients,
+        "depth":     args.depth,
+        "seconds":   elapsed,
+        "ops_per_s": len(samples) / elapsed if elapsed else float("inf"),
+        "p50_ms":    vault.percentile(samples, 50) * 1e3 if samples else None,
+        "p95_ms":    vault.percentile(samples, 95) * 1e3 if samples else None,
+        "p99_ms":    vault.percentile(samples, 99) * 1e3 if samples else None,
+        "max_ms":    samples[-1] * 1e3 if samples else None,
+        **outcome,
+    }
+
+
+def cmd_load(args) -> int:
+    report = asyncio.run(_load(args))
+    if report["p50_ms"] is None:    # every lookup failed
+        latency = "no latencies"
+    else:
+        latency = (f"p50 {report['p50_ms']:.2f} ms  p95 {report['p95_ms']:.2f} ms  "
+                   f"p99 {report['p99_ms']:.2f} ms  max {report['max_ms']:.2f} ms")
+    print(f"{report['requests']} lookups over {report['clients']}×{report['depth']} "
+          f"in {report['seconds']:.2f}s: {report['ops_per_s']:.0f}/s  {latency}  "
+          f"({report['hits']} hits, {report['misses']} misses, {report['errors']} errors)")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 1 if report["errors"] else 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="vault_server",
+                                     description="Local VAULT verification service")
+    parser.add_argument("--db", help=f"vault file (default: {vault.DB_FILE})")
+    parser.add_argument("--socket", help="Unix socket path (default: <vault file>.sock)")
+    parser.add_argument("--tcp", metavar="[HOST:]PORT",
+                        help=f"use TCP instead, e.g. 127.0.0.1:{DEFAULT_PORT}")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("serve", help="answer requests until interrupted")
+    p.add_argument("--backend", choices=sorted(vault._BACKENDS),
+                   help=f"storage backend (default: {vault.STORAGE_BACKEND})")
+    p.add_argument("--workers", type=int, help="lookup threads (default: one per CPU)")
+    p.add_argument("--hash-algo", choices=sorted(vault._HASHERS),
+                   help=f"hashing for added entries (default: {vault.HASH_ALGO})")
+    p.set_defaults(func=cmd_serve)
+
+    p = sub.add_parser("load", help="benchmark a running server with concurrent lookups")
+    p.add_argument("--users", type=int, default=100, help="credentials added for the run")
+    p.add_argument("--requests", type=int, default=10_000, help="lookups to send")
+    p.add_argument("--clients", type=int, default=8, help="connections")
+    p.add_argument("--depth", type=int, default=4, help="requests in flight per connection")
+    p.add_argument("--miss-ratio", type=float, default=0.1, help="share of wrong passwords")
+    p.add_argument("--json", metavar="PATH", help="also write the results as JSON")
+    p.set_defaults(func=cmd_load)
+
+    args = parser.parse_args(argv)
+    if args.db:
+        vault.DB_FILE = os.path.abspath(args.db)
+    if getattr(args, "backend", None):
+        vault.STORAGE_BACKEND = args.backend
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())